@@ -0,0 +1,233 @@
+from collections import Counter
+
+import numpy as np
+
+from dominant_color import DEFAULT_STRATEGY, batched_modes, dominant_colors
+from image_decode import decode_image, read_bytes
+from metrics import Trace
+from palette_index import DEFAULT_PALETTE, SKIN_TONES, UNDERTONES, PaletteIndex
+from skin_classifier import classify_skin, distribution, estimate_undertone
+from skin_sampling import sample_skin, skin_histograms, skin_mask
+
+# OpenCV, PIL and pandas are imported inside the functions that use them so that
+# palette-only callers (manual mode, the palette API) never pay for loading them.
+
+# Bump when a code change alters analysis results in a way the parameters hashed
+# by pipeline_version() do not capture (e.g. classification rules, sampling code).
+ANALYSIS_REVISION = 2
+
+# Colour clusters per face; the dominant skin colour is the largest.
+SKIN_CLUSTERS = 3
+
+# The palette "model" is a compiled lookup over category_palettes; the name is
+# kept for callers that predate palette_index.
+PaletteModel = PaletteIndex
+
+
+def pipeline_version():
+    """Short hash of everything that decides analysis results; part of persistent cache keys."""
+    import hashlib
+    import json
+
+    import dominant_color
+    import face_detector
+    import image_decode
+    import skin_classifier
+    import skin_sampling
+
+    params = {
+        "revision": ANALYSIS_REVISION,
+        # Both cached paths: decoding, detection (boxes are stored), skin masking.
+        "decode_max_side": image_decode.DECODE_MAX_SIDE,
+        "detection": [face_detector.DETECTION_MAX_SIDE, face_detector.SCALE_FACTOR, face_detector.MIN_NEIGHBORS],
+        "skin_hsv": [skin_sampling.SKIN_HSV_LOWER, skin_sampling.SKIN_HSV_UPPER],
+        "regions": skin_sampling.DEFAULT_REGIONS,
+        "working_size": skin_sampling.WORKING_SIZE,
+        "min_region_pixels": skin_sampling.MIN_REGION_PIXELS,
+        "clusters": SKIN_CLUSTERS,
+        "tone_thresholds": skin_classifier.TONE_THRESHOLDS,
+        # analyze_image (API, batch): sampled pixels clustered by DEFAULT_STRATEGY.
+        "sample_budget": skin_sampling.SAMPLE_BUDGET,
+        "strategy": dominant_color.DEFAULT_STRATEGY,
+        "pixel_budget": dominant_color.PIXEL_BUDGET,
+        # analyze_faces (app) with several faces: modes of per-face colour histograms.
+        "histogram_bits": skin_sampling.HISTOGRAM_BITS,
+    }
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:12]
+
+
+# Helper Functions
+def load_image(image_file, max_side=None):
+    return decode_image(read_bytes(image_file), max_side)
+
+def detect_face(img_bgr, detector=None):
+    from face_detector import get_detector
+
+    box = (detector or get_detector()).largest(img_bgr)
+    if box is None:
+        return None
+    x, y, w, h = box
+    return img_bgr[y:y+h, x:x+w]
+
+def extract_skin(face_img):
+    return face_img[skin_mask(face_img) > 0]
+
+def get_dominant_color(pixels, strategy=DEFAULT_STRATEGY):
+    colors, counts = dominant_colors(pixels, strategy, n_clusters=SKIN_CLUSTERS)
+    return colors[0]
+
+def rgb_to_hex(rgb):
+    return '#%02x%02x%02x' % tuple(np.clip(np.array(rgb, dtype=int), 0, 255))
+
+def suggest_colors(skin_tone, undertone, gender, outfit, model):
+    if isinstance(model, PaletteIndex):
+        preds = model.lookup(skin_tone, undertone, gender, outfit).astype(int)
+    else:
+        import pandas as pd
+
+        df = pd.DataFrame([{
+            "SkinToneCategory": skin_tone,
+            "UndertoneType": undertone,
+            "Gender": gender,
+            "Suggested_For": outfit
+        }])
+        preds = model.predict(df).reshape(5, 3)
+    if preds.max() <= 1.0:
+        preds *= 255
+    return [rgb_to_hex(p) for p in preds]
+
+def suggest_group_colors(faces, gender, outfit, model, n_colors=5):
+    """Palettes for every face from ``analyze_faces`` plus one shared palette.
+
+    Returns ``(palettes, group)``: a list of hex palettes, one per face, and a
+    group palette of up to ``n_colors`` colours drawn from them, favouring
+    colours that several people's palettes have in common.
+    """
+    if not faces:
+        return [], []
+    if isinstance(model, PaletteIndex):
+        codes = np.array([model.encode_key((f["skin_tone"], f["undertone"], gender, outfit)) for f in faces])
+        rgb, _ = model.predict_batch(*codes.T)
+        palettes = [[rgb_to_hex(p) for p in palette.astype(int)] for palette in rgb]
+    else:
+        palettes = [suggest_colors(f["skin_tone"], f["undertone"], gender, outfit, model) for f in faces]
+    if len(palettes) == 1:
+        return palettes, list(palettes[0])
+
+    # Distinct colours, most widely shared first, with how many people have each.
+    shared = Counter(color for palette in palettes for color in dict.fromkeys(palette))
+    distinct = [color for color, _ in shared.most_common()]
+    if len(distinct) <= n_colors:
+        return palettes, distinct
+
+    rgb = np.array([[int(h[i:i + 2], 16) for i in (1, 3, 5)] for h in distinct])
+    weights = np.array([shared[h] for h in distinct])
+    centers, _ = dominant_colors(np.repeat(rgb, weights, axis=0), "kmeans", n_clusters=n_colors)
+    group = []
+    for center in centers:
+        # Snap each cluster centre to the nearest colour someone was actually
+        # given and not yet picked, so the group palette has n_colors entries.
+        dist = ((rgb - center) ** 2).sum(axis=1).astype(float)
+        dist[[distinct.index(c) for c in group]] = np.inf
+        group.append(distinct[int(np.argmin(dist))])
+    return palettes, group
+
+
+def analyze_image(img_bgr, detector=None, strategy=DEFAULT_STRATEGY, trace=None):
+    """Run detection, skin sampling, clustering and classification on one BGR image.
+
+    Returns None when no face (or no skin pixels) is found, otherwise a dict with
+    the dominant colour, tone, undertone, face box and per-stage timings in
+    milliseconds. Stages and counters are also recorded on ``trace`` (a new
+    ``metrics.Trace`` when not given).
+    """
+    from face_detector import get_detector
+
+    trace = trace or Trace("analysis")
+    with trace.stage("detect_face"):
+        boxes = (detector or get_detector()).detect(img_bgr)
+    trace.count("faces_found", len(boxes))
+    if not boxes:
+        return None
+    result = _analyze_box(img_bgr, max(boxes, key=lambda f: f[2] * f[3]), strategy, trace)
+    if result is not None:
+        result["timings_ms"] = dict(trace.timings)
+    return result
+
+def _analyze_box(img_bgr, box, strategy, trace):
+    with trace.stage("sample_skin"):
+        skin_pixels = sample_skin(img_bgr, box)
+    trace.count("skin_pixels", len(skin_pixels))
+    if len(skin_pixels) < 3:
+        return None
+
+    with trace.stage("dominant_color"):
+        dominant = get_dominant_color(skin_pixels, strategy)
+
+    with trace.stage("classify"):
+        skin_tone = classify_skin(dominant)
+        undertone = estimate_undertone(dominant)
+        tones, undertones = distribution(skin_pixels)
+
+    return {
+        "skin_tone": skin_tone,
+        "undertone": undertone,
+        "dominant_bgr": [int(c) for c in dominant],
+        "dominant_hex": rgb_to_hex(dominant[::-1]),
+        "face_box": [int(v) for v in box],
+        "skin_pixels": int(len(skin_pixels)),
+        # Share of sampled skin pixels that agree with the dominant colour's class.
+        "tone_confidence": float(tones[SKIN_TONES.index(skin_tone)]),
+        "undertone_confidence": float(undertones[UNDERTONES.index(undertone)]),
+    }
+
+def analyze_faces(img_bgr, detector=None, trace=None):
+    """Analyse every face in one BGR image, in a single pass.
+
+    The frame is masked once and every face's dominant colour comes from one
+    batched histogram, so N faces cost far less than N ``analyze_image`` calls.
+    A single face goes through the same sampling and clustering as
+    ``analyze_image``, so a portrait gets the same result in the app, the API
+    and batch runs. Returns a list of per-face dicts (left to right) with the
+    same colour, tone, undertone and box keys as ``analyze_image``; faces
+    without skin are skipped.
+    """
+    from face_detector import get_detector
+
+    trace = trace or Trace("analysis")
+    with trace.stage("detect_face"):
+        boxes = sorted((detector or get_detector()).detect(img_bgr))
+    trace.count("faces_found", len(boxes))
+    if not boxes:
+        return []
+    if len(boxes) == 1:
+        face = _analyze_box(img_bgr, boxes[0], DEFAULT_STRATEGY, trace)
+        return [face] if face is not None else []
+
+    with trace.stage("sample_skin"):
+        counts, sums = skin_histograms(img_bgr, boxes)
+    with trace.stage("dominant_color"):
+        modes = batched_modes(counts, sums, n_clusters=SKIN_CLUSTERS)
+
+    faces = []
+    with trace.stage("classify"):
+        for box, face_counts, face_sums, (centers, _) in zip(boxes, counts, sums, modes):
+            skin_pixels = int(round(face_counts.sum()))
+            if skin_pixels < 3 or not len(centers):
+                continue
+            dominant = centers[0]
+            skin_tone, undertone = classify_skin(dominant), estimate_undertone(dominant)
+            filled = face_counts > 0
+            tones, undertones = distribution(face_sums[filled] / face_counts[filled, None], face_counts[filled])
+            faces.append({
+                "skin_tone": skin_tone,
+                "undertone": undertone,
+                "dominant_bgr": [int(c) for c in dominant],
+                "dominant_hex": rgb_to_hex(dominant[::-1]),
+                "face_box": [int(v) for v in box],
+                "skin_pixels": skin_pixels,
+                "tone_confidence": float(tones[SKIN_TONES.index(skin_tone)]),
+                "undertone_confidence": float(undertones[UNDERTONES.index(undertone)]),
+            })
+    trace.count("skin_pixels", sum(f["skin_pixels"] for f in faces))
+    return faces
@@ -0,0 +1,185 @@
+"""Caches of image analysis results keyed by upload content.
+
+Streamlit reruns the whole script on every widget change, so without this the
+Gender/Occasion selectboxes would re-run face detection and clustering on an
+image that has not changed. Entries are small dicts (tone, undertone, dominant
+colour), bounded by count and age, and evicted least-recently-used first.
+
+``AnalysisCache`` is per process. Give it a ``PersistentAnalysisCache`` as
+``backing`` to share results between processes and restarts: a SQLite file in
+WAL mode that several app and API processes can read and write at once. Rows
+are keyed by content hash and pipeline version, so changing the analysis
+parameters invalidates them, and the file is capped by entry count.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import REGISTRY
+
+# Stored for images where no face was found so those are not re-analyzed either.
+NO_FACE = object()
+
+
+def content_key(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class AnalysisCache:
+    def __init__(self, maxsize=512, ttl=3600, clock=time.monotonic, backing=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.backing = backing
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return the cached value, or None when absent or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if self.ttl is None or self._clock() - stored_at < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    REGISTRY.inc("analysis_cache_total", result="hit")
+                    return value
+                del self._entries[key]
+        if self.backing is not None:
+            value = self.backing.get(key)
+            if value is not None:
+                self._store(key, value)
+                REGISTRY.inc("analysis_cache_total", result="disk_hit")
+                return value
+        with self._lock:
+            self.misses += 1
+        REGISTRY.inc("analysis_cache_total", result="miss")
+        return None
+
+    def _store(self, key, value):
+        with self._lock:
+            self._entries[key] = (self._clock(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def put(self, key, value):
+        self._store(key, value)
+        if self.backing is not None:
+            self.backing.put(key, value)
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, NO_FACE if value is None else value)
+            return value
+        return None if value is NO_FACE else value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class PersistentAnalysisCache:
+    """Analysis results in a SQLite file shared by every process on the host.
+
+    Values must be JSON-serialisable (or ``NO_FACE``). Rows are keyed by content
+    key and pipeline ``version``, so processes running different versions (as
+    during a rolling deploy) share the file without overwriting or deleting each
+    other's results. Once more than ``max_entries`` rows exist the least recently
+    used are deleted, which is also how rows of retired versions go. Every
+    operation is a single autocommit statement, so concurrent writers only ever
+    wait for each other (up to ``timeout``) and never see partial state. A
+    locked or unwritable database counts as a miss instead of failing the request.
+    """
+
+    # Eviction runs after this many writes rather than on every one.
+    EVICT_EVERY = 64
+
+    def __init__(self, path, version, max_entries=100000, timeout=5.0):
+        self.path = path
+        self.version = version
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._local = threading.local()
+        self._writes = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            # Files written before rows were keyed by version too: start them over.
+            pk = [row[1] for row in db.execute("PRAGMA table_info(analysis)") if row[5]]
+            if pk == ["key"]:
+                db.execute("DROP TABLE analysis")
+            db.execute("CREATE TABLE IF NOT EXISTS analysis ("
+                       " key TEXT NOT NULL, version TEXT NOT NULL, value TEXT NOT NULL, accessed_at REAL NOT NULL,"
+                       " PRIMARY KEY (key, version))")
+            db.execute("CREATE INDEX IF NOT EXISTS analysis_accessed ON analysis (accessed_at)")
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def _db(self):
+        # sqlite3 connections must stay on the thread that opened them.
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def get(self, key):
+        try:
+            db = self._db()
+            row = db.execute("SELECT value FROM analysis WHERE key = ? AND version = ?",
+                             (key, self.version)).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE analysis SET accessed_at = ? WHERE key = ? AND version = ?",
+                       (time.time(), key, self.version))
+        except sqlite3.Error:
+            REGISTRY.inc("analysis_cache_total", result="disk_error")
+            return None
+        value = json.loads(row[0])
+        return NO_FACE if value is None else value
+
+    def put(self, key, value):
+        data = json.dumps(None if value is NO_FACE else value)
+        try:
+            self._db().execute("INSERT OR REPLACE INTO analysis (key, version, value, accessed_at) VALUES (?, ?, ?, ?)",
+                               (key, self.version, data, time.time()))
+            self._writes += 1
+            if self._writes % self.EVICT_EVERY == 0:
+                self.evict()
+        except sqlite3.Error:
+            REGISTRY.inc("analysis_cache_total", result="disk_error")
+
+    def evict(self):
+        self._db().execute(
+            "DELETE FROM analysis WHERE rowid IN (SELECT rowid FROM analysis ORDER BY accessed_at"
+            " LIMIT max(0, (SELECT COUNT(*) FROM analysis) - ?))", (self.max_entries,))
+
+    def clear(self):
+        self._db().execute("DELETE FROM analysis")
+
+    def __len__(self):
+        return self._db().execute("SELECT COUNT(*) FROM analysis").fetchone()[0]
+
+
+def open_persistent_cache(version, var="FASHIONAI_CACHE_PATH"):
+    """``PersistentAnalysisCache`` at ``$FASHIONAI_CACHE_PATH``, or None when unset."""
+    path = os.environ.get(var)
+    return PersistentAnalysisCache(path, version) if path else None
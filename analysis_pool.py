@@ -0,0 +1,155 @@
+"""Process-wide pool that runs image analysis off the Streamlit script threads.
+
+Every Streamlit session runs its script on its own thread, so concurrent uploads
+used to run detection and clustering side by side in one process, each also
+free to start OpenCV/BLAS thread pools, and everyone slowed down together.
+``AnalysisPool`` sends that work to a fixed set of worker processes instead:
+
+* each worker is pinned to one OpenCV/BLAS/OpenMP thread, so N workers use N
+  cores and throughput grows with cores instead of collapsing;
+* at most ``max_pending`` jobs may be queued or running; ``submit`` raises
+  ``PoolBusy`` beyond that, so overload is answered at once instead of thrashing;
+* a ``Job`` reports its queue position while waiting and can be given up on
+  with a timeout.
+"""
+import itertools
+import multiprocessing
+import os
+import sys
+import threading
+import types
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeout, wait as wait_futures
+
+from metrics import REGISTRY
+
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+# Seconds a session waits for its analysis before giving up.
+DEFAULT_TIMEOUT = 30.0
+
+
+class PoolBusy(Exception):
+    pass
+
+
+def _init_worker():
+    # Environment first, for libraries loaded later; then the ones already loaded.
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = "1"
+    import cv2
+    cv2.setNumThreads(1)
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(1)
+    except ImportError:
+        pass
+    # Load the cascade now rather than in the first user's request.
+    from face_detector import get_detector
+    get_detector()
+
+
+def analyze_upload(image_bytes):
+    """Worker side: decode and analyse every face; returns ``(faces, timings_ms, counters)``."""
+    from analysis import analyze_faces, load_image
+    from image_decode import DECODE_MAX_SIDE
+    from metrics import Trace
+
+    trace = Trace("pool")
+    with trace.stage("load_image"):
+        img_bgr = load_image(image_bytes, DECODE_MAX_SIDE)
+    faces = analyze_faces(img_bgr, trace=trace)
+    return faces, dict(trace.timings), dict(trace.counters)
+
+
+def _start_workers(executor, workers):
+    # Spawned workers re-import the parent's __main__, which under Streamlit is
+    # the app script itself (it would rerun the page, start the metrics server,
+    # ...). Workers only need this module, so show them an empty __main__ while
+    # they start. Other script threads also set __main__ on every rerun, so all
+    # workers are started here, once, rather than on demand in submit().
+    main = sys.modules["__main__"]
+    sys.modules["__main__"] = types.ModuleType("__main__")
+    try:
+        # One job per worker: with none idle, each submit starts a process.
+        for _ in range(workers):
+            executor.submit(os.getpid)
+    finally:
+        sys.modules["__main__"] = main
+
+
+class Job:
+    def __init__(self, pool, seq, future):
+        self._pool = pool
+        self.seq = seq
+        self.future = future
+
+    def done(self):
+        return self.future.done()
+
+    def wait(self, timeout):
+        """Block up to ``timeout`` seconds; True once the job has finished."""
+        return bool(wait_futures([self.future], timeout).done)
+
+    def position(self):
+        """Place in the queue (1 = starts next); 0 once running or finished."""
+        return self._pool._position(self.seq)
+
+    def result(self, timeout=DEFAULT_TIMEOUT):
+        """The job's return value; raises ``FuturesTimeout`` (and cancels it if still queued)."""
+        try:
+            return self.future.result(timeout)
+        except FuturesTimeout:
+            self.future.cancel()
+            REGISTRY.inc("analysis_pool_jobs_total", result="timeout")
+            raise
+
+
+class AnalysisPool:
+    def __init__(self, workers=None, max_pending=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 4 * self.workers
+        # spawn: forking a process that is running Streamlit's server threads is unsafe.
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                             mp_context=multiprocessing.get_context("spawn"))
+        _start_workers(self._executor, self.workers)
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._seq = itertools.count()
+
+    def submit(self, fn, *args):
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                REGISTRY.inc("analysis_pool_jobs_total", result="rejected")
+                raise PoolBusy(f"{len(self._pending)} analyses already pending")
+            seq = next(self._seq)
+            future = self._executor.submit(fn, *args)
+            self._pending[seq] = future
+        future.add_done_callback(lambda f, seq=seq: self._finished(seq, f))
+        REGISTRY.inc("analysis_pool_jobs_total", result="accepted")
+        return Job(self, seq, future)
+
+    def _finished(self, seq, future):
+        with self._lock:
+            self._pending.pop(seq, None)
+
+    def _position(self, seq):
+        with self._lock:
+            if seq not in self._pending:
+                return 0
+            # Jobs are started in submission order; the oldest ``workers`` run.
+            ahead = sum(1 for s in self._pending if s < seq)
+        return max(0, ahead - self.workers + 1)
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def pool_from_env():
+    """Pool sized by $FASHIONAI_ANALYSIS_WORKERS / $FASHIONAI_MAX_PENDING (defaults: all cores, 4 per worker)."""
+    workers = int(os.environ.get("FASHIONAI_ANALYSIS_WORKERS", 0)) or None
+    max_pending = int(os.environ.get("FASHIONAI_MAX_PENDING", 0)) or None
+    return AnalysisPool(workers, max_pending)
@@ -0,0 +1,455 @@
+"""Asyncio HTTP inference API with request micro-batching.
+
+Endpoints (JSON responses):
+
+    POST /v1/analyze?gender=Female&occasion=Party   body: image bytes
+        -> {"skin_tone", "undertone", "dominant_hex", "face_box", "palette"}
+    POST /v1/palette   body: {"skin_tone", "undertone", "gender", "occasion"}
+                       or a list of such objects
+        -> {"palette": [...], "fallback": bool} (or a list of them)
+    POST /v1/match     body: a /v1/palette profile, optionally with "k" (at most
+                       MAX_MATCHES) and "max_delta_e"
+        -> {"palette": [...], "fallback": bool, "matches": [garments]}
+           (503 unless the server was started with a garment catalogue)
+    GET  /healthz
+    GET  /metrics      Prometheus text format
+
+Each image is decoded and analysed on a worker pool as soon as it arrives, so
+no request waits for another's image. Palette lookups, from /v1/palette and
+from finished analyses alike, are collected into small micro-batches (up to
+``max_batch`` items or ``max_wait`` seconds) and answered by one
+``PaletteIndex.predict_batch`` call. Both are bounded: beyond ``max_queue``
+images in flight, or a full palette queue, the request is answered with 429 and
+``Retry-After`` instead of being held in memory, and request bodies over
+``MAX_BODY_BYTES`` get 413. Bodies that do not decode as an image get 400; any
+other analysis failure is a server fault and gets 500.
+
+    python api_server.py --port 8080 --workers 4
+
+For tests, ``run_in_background()`` starts a server on a free local port in a
+background thread and yields its base URL.
+"""
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from analysis import analyze_image, load_image, pipeline_version, rgb_to_hex
+from analysis_cache import AnalysisCache, PersistentAnalysisCache, content_key, open_persistent_cache
+from garment_catalogue import MAX_DELTA_E, GarmentCatalogue, load_from_env
+from image_decode import DECODE_MAX_SIDE
+from metrics import REGISTRY, Trace
+from palette_index import COLUMNS, PaletteIndex
+
+RESULT_FIELDS = ("skin_tone", "undertone", "dominant_hex", "face_box")
+
+MAX_BODY_BYTES = 10 * 1024 * 1024
+MAX_HEADER_BYTES = 16 * 1024
+
+# Upper bound on garments /v1/match returns; larger "k" values are capped to it.
+MAX_MATCHES = 100
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           411: "Length Required", 413: "Payload Too Large", 429: "Too Many Requests",
+           500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class Overloaded(Exception):
+    pass
+
+
+class BadImage(Exception):
+    """The request body could not be decoded as an image."""
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class MicroBatcher:
+    """Collects submitted items into batches for ``handler(list) -> list``.
+
+    ``submit`` raises ``Overloaded`` immediately when ``max_queue`` items are
+    already waiting. When the handler raises for a batch, its items are retried
+    one at a time, so an exception only reaches the request that caused it.
+    """
+
+    def __init__(self, handler, max_batch=16, max_wait=0.01, max_queue=64, name="batch"):
+        self.handler = handler
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.name = name
+        self._queue = asyncio.Queue(maxsize=max_queue)
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def submit(self, item):
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((item, future))
+        except asyncio.QueueFull:
+            REGISTRY.inc("api_rejected_total", batcher=self.name)
+            raise Overloaded(self.name)
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            REGISTRY.inc("api_batches_total", batcher=self.name)
+            REGISTRY.inc("api_batch_items_total", len(batch), batcher=self.name)
+            try:
+                results = await self.handler([item for item, _ in batch])
+            except Exception as exc:
+                if len(batch) == 1:
+                    results = [exc]
+                else:
+                    # Retry one by one so a bad item fails only its own request.
+                    results = [await self._run_one(item) for item, _ in batch]
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+
+    async def _run_one(self, item):
+        try:
+            return (await self.handler([item]))[0]
+        except Exception as exc:
+            return exc
+
+
+class InferenceService:
+    def __init__(self, executor=None, workers=None, max_batch=16, max_wait=0.01, max_queue=64, catalogue=None,
+                 cache=None):
+        self.palettes = PaletteIndex()
+        self.catalogue = catalogue
+        self.cache = cache
+        self._own_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=workers or os.cpu_count(),
+                                                       thread_name_prefix="analyze")
+        self.max_images = max_queue
+        self._images_in_flight = 0
+        self.palette_batcher = MicroBatcher(self._palette_batch, max_batch * 8, max_wait, max_queue * 8,
+                                            name="palette")
+
+    def start(self):
+        self.palette_batcher.start()
+
+    async def stop(self):
+        await self.palette_batcher.stop()
+        if self._own_executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _palettes_for(self, profiles):
+        codes = [self.palettes.encode(c, [p[i] for p in profiles]) for i, c in enumerate(COLUMNS)]
+        palettes, fallback = self.palettes.predict_batch(*codes)
+        return [
+            {"palette": [rgb_to_hex(c) for c in palette], "fallback": bool(fb)}
+            for palette, fb in zip(palettes, fallback)
+        ]
+
+    async def _palette_batch(self, profiles):
+        return self._palettes_for(profiles)
+
+    def _analyze_cached(self, data):
+        if self.cache is None:
+            return _analyze_bytes(data)
+        return self.cache.get_or_compute("image:" + content_key(data), lambda: _analyze_bytes(data))
+
+    async def analyze(self, data, gender, occasion):
+        # Only the event loop thread touches the in-flight count.
+        if self._images_in_flight >= self.max_images:
+            REGISTRY.inc("api_rejected_total", batcher="analyze")
+            raise Overloaded("analyze")
+        self._images_in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            analysis = await loop.run_in_executor(self.executor, self._analyze_cached, data)
+        except BadImage as exc:
+            raise HTTPError(400, f"could not decode image: {exc}")
+        finally:
+            self._images_in_flight -= 1
+        if analysis is None:
+            return {"face_found": False}
+        result = {"face_found": True, **{k: analysis[k] for k in RESULT_FIELDS}}
+        result.update(await self.palette((analysis["skin_tone"], analysis["undertone"], gender, occasion)))
+        return result
+
+    async def palette(self, profile):
+        return await self.palette_batcher.submit(profile)
+
+    async def match(self, profile, k=10, max_delta_e=MAX_DELTA_E):
+        if self.catalogue is None:
+            raise HTTPError(503, "no garment catalogue loaded")
+        result = await self.palette(profile)
+        loop = asyncio.get_running_loop()
+        matches = await loop.run_in_executor(
+            self.executor, self.catalogue.match, result["palette"], profile[2], profile[3], k, max_delta_e,
+        )
+        return {**result, "matches": matches}
+
+
+def _analyze_bytes(data):
+    trace = Trace("api")
+    with trace.stage("load_image"):
+        try:
+            img_bgr = load_image(data, DECODE_MAX_SIDE)
+        except MemoryError:
+            raise
+        except Exception as exc:
+            raise BadImage(exc)
+    result = analyze_image(img_bgr, trace=trace)
+    trace.emit()
+    return result
+
+
+def _profile(obj):
+    try:
+        profile = (obj["skin_tone"], obj["undertone"], obj["gender"], obj["occasion"])
+    except (KeyError, TypeError):
+        profile = None
+    if profile is None or not all(isinstance(v, str) for v in profile):
+        raise HTTPError(400, "profile needs string skin_tone, undertone, gender and occasion")
+    return profile
+
+
+class InferenceServer:
+    def __init__(self, service=None, **service_options):
+        self.service = service or InferenceService(**service_options)
+        self._server = None
+        self.port = None
+
+    async def start(self, host="127.0.0.1", port=0):
+        self.service.start()
+        self._server = await asyncio.start_server(self._handle_connection, host, port, limit=MAX_HEADER_BYTES)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        await self.service.stop()
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except HTTPError as exc:
+                    await _respond(writer, exc.status, {"error": str(exc)}, close=True)
+                    return
+                if request is None:
+                    return
+                method, target, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                t0 = time.perf_counter()
+                status, payload, extra = await self._dispatch(method, target, headers, body)
+                REGISTRY.observe("api_request_seconds", time.perf_counter() - t0, status=str(status))
+                await _respond(writer, status, payload, extra, close=not keep_alive)
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method, target, headers, body):
+        url = urlsplit(target)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            if url.path == "/healthz":
+                return 200, {"status": "ok"}, {}
+            if url.path == "/metrics":
+                return 200, REGISTRY.render(), {"Content-Type": "text/plain; version=0.0.4"}
+            if url.path == "/v1/analyze":
+                if method != "POST":
+                    raise HTTPError(405, "use POST with the image as the request body")
+                if not body:
+                    raise HTTPError(400, "empty body")
+                gender = query.get("gender", "Unisex")
+                occasion = query.get("occasion", "Daily")
+                return 200, await self.service.analyze(body, gender, occasion), {}
+            if url.path == "/v1/palette":
+                if method != "POST":
+                    raise HTTPError(405, "use POST with a JSON profile")
+                try:
+                    payload = json.loads(body or b"null")
+                except ValueError:
+                    raise HTTPError(400, "body is not valid JSON")
+                if isinstance(payload, list):
+                    profiles = [_profile(p) for p in payload]
+                    return 200, list(await asyncio.gather(*(self.service.palette(p) for p in profiles))), {}
+                return 200, await self.service.palette(_profile(payload)), {}
+            if url.path == "/v1/match":
+                if method != "POST":
+                    raise HTTPError(405, "use POST with a JSON profile")
+                try:
+                    payload = json.loads(body or b"null")
+                    k = int(payload.get("k", 10))
+                    max_delta_e = float(payload.get("max_delta_e", MAX_DELTA_E))
+                except (ValueError, TypeError, AttributeError):
+                    raise HTTPError(400, "body must be a JSON profile object")
+                if k < 1:
+                    raise HTTPError(400, "k must be at least 1")
+                k = min(k, MAX_MATCHES)
+                return 200, await self.service.match(_profile(payload), k, max_delta_e), {}
+            raise HTTPError(404, f"no route for {url.path}")
+        except Overloaded:
+            return 429, {"error": "server busy, retry shortly"}, {"Retry-After": "1"}
+        except HTTPError as exc:
+            return exc.status, {"error": str(exc)}, {}
+        except Exception as exc:
+            return 500, {"error": f"{type(exc).__name__}: {exc}"}, {}
+
+
+async def _read_request(reader):
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as exc:
+        if not exc.partial:
+            return None
+        raise
+    except asyncio.LimitOverrunError:
+        raise HTTPError(413, "headers too large")
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, _ = lines[0].split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "malformed request line")
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        raise HTTPError(411, "chunked bodies are not supported; send Content-Length")
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise HTTPError(400, "invalid Content-Length")
+    if length < 0:
+        raise HTTPError(400, "invalid Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, f"body larger than {MAX_BODY_BYTES} bytes")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target, headers, body
+
+
+async def _respond(writer, status, payload, extra_headers=None, close=False):
+    if isinstance(payload, str):
+        body = payload.encode()
+        content_type = "text/plain; charset=utf-8"
+    else:
+        body = json.dumps(payload, default=_json_default).encode()
+        content_type = "application/json"
+    headers = {"Content-Type": content_type, "Content-Length": str(len(body))}
+    headers.update(extra_headers or {})
+    if close:
+        headers["Connection"] = "close"
+    head = f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+    head += "".join(f"{k}: {v}\r\n" for k, v in headers.items()) + "\r\n"
+    writer.write(head.encode("latin-1") + body)
+    await writer.drain()
+
+
+def _json_default(obj):
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"{type(obj).__name__} is not JSON serializable")
+
+
+@contextmanager
+def run_in_background(host="127.0.0.1", port=0, **service_options):
+    """Run a server in a background thread; yields its base URL."""
+    loop = asyncio.new_event_loop()
+    server = InferenceServer(**service_options)
+    started = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(server.start(host, port))
+        started.set()
+        loop.run_forever()
+
+    thread = threading.Thread(target=run, name="api-server", daemon=True)
+    thread.start()
+    started.wait()
+    try:
+        yield f"http://{host}:{server.port}"
+    finally:
+        asyncio.run_coroutine_threadsafe(server.close(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Skin tone / palette inference API.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=None, help="analysis threads (default: all cores)")
+    parser.add_argument("--max-batch", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=10)
+    parser.add_argument("--max-queue", type=int, default=64, help="images in flight before answering 429")
+    parser.add_argument("--cache", default=None,
+                        help="SQLite analysis cache shared with other processes (default: $FASHIONAI_CACHE_PATH)")
+    parser.add_argument("--catalogue", default=None,
+                        help="garment catalogue (CSV/Parquet) for /v1/match (default: $FASHIONAI_CATALOGUE)")
+    args = parser.parse_args(argv)
+    catalogue = GarmentCatalogue.from_file(args.catalogue) if args.catalogue else load_from_env()
+    version = pipeline_version()
+    backing = PersistentAnalysisCache(args.cache, version) if args.cache else open_persistent_cache(version)
+    cache = AnalysisCache(maxsize=1024, ttl=3600, backing=backing)
+
+    async def serve():
+        server = InferenceServer(workers=args.workers, max_batch=args.max_batch,
+                                 max_wait=args.max_wait_ms / 1000, max_queue=args.max_queue,
+                                 catalogue=catalogue, cache=cache)
+        await server.start(args.host, args.port)
+        print(f"listening on http://{args.host}:{server.port}")
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
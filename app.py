@@ -1,120 +1,162 @@
+import os
+import threading
+import time
+
 import streamlit as st
-import numpy as np
-import pandas as pd
-import cv2
-from PIL import Image
-from sklearn.cluster import KMeans
-from matplotlib import pyplot as plt
-from matplotlib.colors import to_rgb
-import io
-import base64
-from category_palettes import category_palettes  # Assuming this is a separate module with predefined palettes
+# Only light modules are imported up front. OpenCV (face detection, skin
+# masking) and the clustering code load in the analysis worker processes on
+# first use in mode 1, so modes 2 and 3 start without them.
+from analysis import PaletteModel, pipeline_version, suggest_colors, suggest_group_colors
+from analysis_cache import AnalysisCache, content_key, open_persistent_cache
+from asset_bundle import load_bundle
+from metrics import Trace, configure_from_env
+from palette_render import palette_png
 
 # Load model
-import joblib
+# import joblib
 # pipeline = joblib.load("color_recommender.pkl")
 
-# Hardcoded palette dictionary as placeholder for specific category results
-# category_palettes = {
-#     ("Fair", "Cool", "Female", "Party"): [[255, 182, 193], [173, 216, 230], [221, 160, 221], [240, 248, 255], [255, 240, 245]],
-#     ("Medium", "Neutral", "Female", "Party"): [[255, 140, 0], [255, 105, 180], [72, 209, 204], [255, 160, 122], [199, 21, 133]],
-#     ("Dark", "Warm", "Male", "Formal"): [[139, 69, 19], [184, 134, 11], [160, 82, 45], [205, 133, 63], [218, 165, 32]],
-#     ("Olive", "Cool", "Unisex", "Daily"): [[70, 130, 180], [100, 149, 237], [0, 191, 255], [176, 224, 230], [95, 158, 160]]
-#     # Add more specific combinations as needed
-# }
-
-class PaletteModel:
-    def predict(self, X):
-        row = X.iloc[0]
-        key = (row['SkinToneCategory'], row['UndertoneType'], row['Gender'], row['Suggested_For'])
-        return np.array(category_palettes.get(key, [[102, 205, 170], [255, 105, 180], [75, 0, 130], [255, 165, 0], [70, 130, 180]])).flatten()
-
-pipeline = PaletteModel()
-
-# Helper Functions
-def load_image(image_file):
-    img = Image.open(image_file)
-    return cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
-
-def detect_face(img_bgr):
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-    gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY)
-    faces = face_cascade.detectMultiScale(gray, 1.3, 5)
-    if len(faces) == 0:
-        return None
-    x, y, w, h = sorted(faces, key=lambda f: f[2]*f[3], reverse=True)[0]
-    return img_bgr[y:y+h, x:x+w]
-
-def extract_skin(face_img):
-    hsv = cv2.cvtColor(face_img, cv2.COLOR_BGR2HSV)
-    lower = np.array([0, 20, 70], dtype=np.uint8)
-    upper = np.array([20, 255, 255], dtype=np.uint8)
-    mask = cv2.inRange(hsv, lower, upper)
-    return face_img[mask > 0]
-
-def get_dominant_color(pixels):
-    kmeans = KMeans(n_clusters=3, random_state=42, n_init=10).fit(pixels)
-    colors = kmeans.cluster_centers_.astype(int)
-    counts = np.bincount(kmeans.labels_)
-    return colors[np.argmax(counts)]
-
-def classify_skin(rgb):
-    b, g, r = rgb
-    brightness = (r + g + b) / 3
-    if brightness >= 210: return "Fair"
-    elif brightness >= 170: return "Medium"
-    elif brightness >= 130: return "Olive"
-    elif brightness >= 100: return "Tan"
-    elif brightness >= 70: return "Dark"
-    else: return "Very Dark"
-
-def estimate_undertone(rgb):
-    r, g, b = [x / 255.0 for x in rgb]
-    if r > g and b > g:
-        return "Cool"
-    elif g > b and r > b:
-        return "Warm"
-    return "Neutral"
-
-def rgb_to_hex(rgb):
-    return '#%02x%02x%02x' % tuple(np.clip(np.array(rgb, dtype=int), 0, 255))
-
-def suggest_colors(skin_tone, undertone, gender, outfit, model):
-    df = pd.DataFrame([{
-        "SkinToneCategory": skin_tone,
-        "UndertoneType": undertone,
-        "Gender": gender,
-        "Suggested_For": outfit
-    }])
-    preds = model.predict(df).reshape(5, 3)
-    if preds.max() <= 1.0:
-        preds *= 255
-    return [rgb_to_hex(p) for p in preds]
-
-def plot_palette(hex_colors):
-    fig, ax = plt.subplots(1, 5, figsize=(10, 2))
-    for i, hex_color in enumerate(hex_colors):
-        ax[i].imshow([[to_rgb(hex_color)]])
-        ax[i].set_title(hex_color, fontsize=8)
-        ax[i].axis('off')
-    plt.tight_layout()
-    return fig
-
-def download_palette(fig):
-    buf = io.BytesIO()
-    fig.savefig(buf, format='png')
-    buf.seek(0)
-    return buf
+@st.cache_resource(show_spinner=False)
+def load_palette_model():
+    return PaletteModel()
+
+pipeline = load_palette_model()
+
+@st.cache_resource(show_spinner=False)
+def load_analysis_pool():
+    # Worker processes shared by every session; see analysis_pool.py.
+    from analysis_pool import pool_from_env
+    return pool_from_env()
+
+@st.cache_resource
+def load_analysis_cache():
+    # One cache per server process, shared by every session, backed by the
+    # cross-process SQLite cache when $FASHIONAI_CACHE_PATH is set.
+    return AnalysisCache(maxsize=512, ttl=3600, backing=open_persistent_cache(pipeline_version()))
+
+@st.cache_resource(show_spinner=False)
+def load_catalogue():
+    # Garment catalogue from $FASHIONAI_CATALOGUE; None disables garment matching.
+    from garment_catalogue import load_from_env
+    return load_from_env()
+
+@st.cache_resource(show_spinner=False)
+def load_assets():
+    # Prebuilt swatches and web-sized images (python asset_bundle.py); None if not built.
+    return load_bundle()
+
+assets = load_assets()
+
+@st.cache_resource(show_spinner=False)
+def init_metrics():
+    # Metrics endpoint / file sink / JSON log, once per server process.
+    return configure_from_env()
+
+init_metrics()
+
+@st.cache_resource
+def analysis_pool_lock():
+    # Module globals are re-created on every rerun; this lock is shared.
+    return threading.Lock()
+
+def restart_analysis_pool(pool):
+    # A dead worker (e.g. killed for memory) breaks a process pool for good;
+    # drop the shared one so the next caller builds fresh workers, unless
+    # another session hit the same crash and already replaced it.
+    with analysis_pool_lock():
+        if load_analysis_pool() is pool:
+            load_analysis_pool.clear()
+    pool.shutdown(wait=False)
+
+def analyze_upload(image_bytes, trace):
+    from concurrent.futures.process import BrokenProcessPool
+    from analysis_pool import DEFAULT_TIMEOUT, FuturesTimeout, PoolBusy, analyze_upload as analysis_job
+
+    trace.note("analysis_cache_hit", 0)
+    # Second attempt only after the pool was rebuilt.
+    for attempt in range(2):
+        pool = load_analysis_pool()
+        try:
+            job = pool.submit(analysis_job, image_bytes)
+        except PoolBusy:
+            trace.note("analysis_rejected", 1)
+            st.warning("The server is busy analysing other photos. Please try again in a moment.")
+            st.stop()
+        except BrokenProcessPool:
+            restart_analysis_pool(pool)
+            continue
+        status = st.empty()
+        deadline = time.monotonic() + DEFAULT_TIMEOUT
+        with trace.stage("analysis_wait"):
+            while not job.wait(0.2) and time.monotonic() < deadline:
+                position = job.position()
+                status.info(f"⏳ Waiting for a free analyser (#{position} in queue)" if position else "🔍 Analysing photo...")
+        status.empty()
+        try:
+            # Every face in the photo, analysed together; [] when none are found.
+            faces, timings, counters = job.result(timeout=0)
+        except BrokenProcessPool:
+            restart_analysis_pool(pool)
+            continue
+        except FuturesTimeout:
+            st.error("Analysis took too long. Please try again.")
+            st.stop()
+        except Exception as exc:
+            st.error(f"Could not analyse this photo ({type(exc).__name__}). Please try another image.")
+            st.stop()
+        break
+    else:
+        st.error("The analyser stopped while processing this photo. Please try a smaller image.")
+        st.stop()
+    # The worker's trace lives in another process; apply its numbers here.
+    trace.merge(timings)
+    trace.merge_counts(counters)
+    return faces
+
+def palette_for(skin_tone, undertone, gender, outfit, trace):
+    fallback = not pipeline.has_palette(skin_tone, undertone, gender, outfit)
+    trace.note("palette_fallback", int(fallback))
+    if assets is not None:
+        if fallback:
+            # The bundle answers without PaletteIndex.lookup, which counts fallbacks.
+            pipeline.record_fallback(skin_tone, undertone, gender, outfit)
+        with trace.stage("palette_lookup"):
+            entry = assets.palette(skin_tone, undertone, gender, outfit)
+            return entry["hex"], assets.read(entry["png"]), assets.url(entry["png"])
+    with trace.stage("palette_lookup"):
+        hex_colors = suggest_colors(skin_tone, undertone, gender, outfit, pipeline)
+    with trace.stage("render_palette"):
+        png = palette_png(hex_colors)
+    return hex_colors, png, None
+
+def show_image(image, url=None):
+    # Bundled assets are referenced by URL so that browsers cache them.
+    if url is not None:
+        st.markdown(f'<img src="{url}" style="width:100%">', unsafe_allow_html=True)
+    else:
+        st.image(image, use_column_width=True)
+
+def show_matches(hex_colors, gender, outfit, trace):
+    if os.environ.get("FASHIONAI_CATALOGUE") is None:
+        return
+    with trace.stage("match_garments"):
+        matches = load_catalogue().match(hex_colors, gender, outfit)
+    st.markdown("### 👕 Matching Garments")
+    if matches:
+        st.dataframe(matches, use_container_width=True)
+    else:
+        st.info("No in-stock garments close to this palette.")
 
 # Streamlit App
 st.set_page_config(layout="wide")
 st.title("🎨 Skin Tone Based Outfit Color Palette Generator")
 
-option = st.sidebar.selectbox("Choose Mode", [
+option = st.sidebar.selectbox("Choose Mode", key="mode", options=[
     "1️⃣ Upload Image to Generate Report", 
     "2️⃣ Manual Input Color Suggestion", 
     "3️⃣ Educational Universal Report"
 ])
+trace = Trace("mode" + option[0])
 
 if option.startswith("1"):
     st.header("📷 Upload Image to Generate Color Palette")
@@ -126,24 +168,42 @@ if option.startswith("1"):
         image_file = st.camera_input("Capture Image")
 
     if image_file is not None:
-        img_bgr = load_image(image_file)
-        face = detect_face(img_bgr)
-        if face is None:
+        image_bytes = image_file.getvalue()
+        trace.note("analysis_cache_hit", 1)
+        faces = load_analysis_cache().get_or_compute(
+            "faces:" + content_key(image_bytes),
+            lambda: analyze_upload(image_bytes, trace),
+        )
+        if not faces:
             st.error("No face detected!")
+        elif len(faces) > 1:
+            st.success(f"Detected {len(faces)} people (left to right)")
+            gender = st.selectbox("Select Gender", ["Male", "Female", "Unisex"])
+            outfit = st.selectbox("Occasion", ["Casual", "Formal", "Party", "Festive", "Daily"])
+            with trace.stage("palette_lookup"):
+                palettes, group = suggest_group_colors(faces, gender, outfit, pipeline)
+            with trace.stage("render_palette"):
+                pngs = [palette_png(p) for p in palettes]
+                group_png = palette_png(group)
+            for i, (face, png) in enumerate(zip(faces, pngs), 1):
+                st.markdown(f"**Person {i}:** {face['skin_tone']} skin tone, {face['undertone']} undertone")
+                st.image(png, use_column_width=True)
+            st.markdown("### 👥 Group Palette")
+            st.image(group_png, use_column_width=True)
+            st.download_button("📥 Download Group Palette", data=group_png, file_name="group_palette.png", mime="image/png")
+            show_matches(group, gender, outfit, trace)
         else:
-            skin_pixels = extract_skin(face)
-            dominant_rgb = get_dominant_color(skin_pixels)
-            skin_tone = classify_skin(dominant_rgb)
-            undertone = estimate_undertone(dominant_rgb)
+            analysis = faces[0]
+            skin_tone = analysis["skin_tone"]
+            undertone = analysis["undertone"]
             st.success(f"Detected Skin Tone: {skin_tone}")
             st.success(f"Undertone: {undertone}")
             gender = st.selectbox("Select Gender", ["Male", "Female", "Unisex"])
             outfit = st.selectbox("Occasion", ["Casual", "Formal", "Party", "Festive", "Daily"])
-            hex_colors = suggest_colors(skin_tone, undertone, gender, outfit, pipeline)
-            fig = plot_palette(hex_colors)
-            st.pyplot(fig)
-            buf = download_palette(fig)
-            st.download_button("📥 Download Palette", data=buf, file_name="palette.png")
+            hex_colors, png, url = palette_for(skin_tone, undertone, gender, outfit, trace)
+            show_image(png, url)
+            st.download_button("📥 Download Palette", data=png, file_name="palette.png", mime="image/png")
+            show_matches(hex_colors, gender, outfit, trace)
 
 elif option.startswith("2"):
     st.header("✍️ Manual Input for Palette Recommendation")
@@ -152,11 +212,10 @@ elif option.startswith("2"):
     gender = st.selectbox("Select Gender", ["Male", "Female", "Unisex"])
     outfit = st.selectbox("Occasion", ["Casual", "Party", "Formal", "Festive", "Daily"])
     if st.button("Generate Palette"):
-        hex_colors = suggest_colors(skin_tone, undertone, gender, outfit, pipeline)
-        fig = plot_palette(hex_colors)
-        st.pyplot(fig)
-        buf = download_palette(fig)
-        st.download_button("📥 Download Palette", data=buf, file_name="manual_palette.png")
+        hex_colors, png, url = palette_for(skin_tone, undertone, gender, outfit, trace)
+        show_image(png, url)
+        st.download_button("📥 Download Palette", data=png, file_name="manual_palette.png", mime="image/png")
+        show_matches(hex_colors, gender, outfit, trace)
 
 elif option.startswith("3"):
     st.header("📚 Educational Fashion Report")
@@ -165,11 +224,11 @@ elif option.startswith("3"):
 # ✅ Valid skin tone reference image
     # ✅ Load your local image for MEN
     st.markdown("**<span style='font-size:18px;'>Men's Skin Tone Palette</span>**", unsafe_allow_html=True)
-    st.image("08d55e0b8465e292e4feb848b6b695f6.jpg", use_column_width=True)
+    show_image("08d55e0b8465e292e4feb848b6b695f6.jpg", assets and assets.image_url("08d55e0b8465e292e4feb848b6b695f6.jpg"))
 
 # ✅ Load your local image for WOMEN
     st.markdown("**<span style='font-size:18px;'>Women's Skin Tone Palette</span>**", unsafe_allow_html=True)
-    st.image("march-Blog-skin-tone-color-chart.jpg", use_column_width=True)
+    show_image("march-Blog-skin-tone-color-chart.jpg", assets and assets.image_url("march-Blog-skin-tone-color-chart.jpg"))
 
     # --- Skin Tone Categories ---
     st.markdown("### 🎨 Skin Tone Categories & Suggested Colors:")
@@ -228,5 +287,12 @@ elif option.startswith("3"):
     # End section
     st.markdown("👉 Try Modes 1 or 2 in the app for personalized AI-based outfit suggestions!")
 
+trace.emit()
+if st.sidebar.checkbox("Show timing breakdown", key="debug_timings"):
+    st.sidebar.json({
+        "timings_ms": {k: round(v, 2) for k, v in trace.timings.items()},
+        "counters": dict(trace.counters),
+    })
+
 st.markdown("---")
 st.caption("Built with ❤️ by Sonu Kumar Sharma – FashionAI")
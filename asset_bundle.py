@@ -0,0 +1,164 @@
+"""Precomputed, content-addressed palette and image assets.
+
+Every palette in ``category_palettes`` (and the default fallback) is static, so
+a build step renders each one once: hex list, PNG swatch and JSON, named by the
+hash of their content. The educational reference photos are resized to web size
+the same way. ``manifest.json`` maps profiles and image names to those files.
+
+    python asset_bundle.py            # writes static/bundle/
+
+Streamlit serves ``static/`` at ``app/static/`` when ``server.enableStaticServing``
+is on (see .streamlit/config.toml). URLs carry the content hash as ``?v=``, which
+makes the server send year-long ``Cache-Control`` headers; a rebuilt asset gets
+a new name, so caches never serve a stale one. The app falls back to rendering
+at request time when no bundle has been built, or when the manifest's
+``sources`` hash no longer matches the palettes, renderer and image settings it
+was built from (rebuild it then).
+"""
+import argparse
+import hashlib
+import io
+import json
+import logging
+import os
+
+from category_palettes import category_palettes
+from palette_index import DEFAULT_PALETTE
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+BUNDLE_DIR = os.path.join(ROOT, "static", "bundle")
+# URL prefix under which Streamlit serves BUNDLE_DIR.
+BUNDLE_URL = "app/static/bundle"
+
+REFERENCE_IMAGES = ["08d55e0b8465e292e4feb848b6b695f6.jpg", "march-Blog-skin-tone-color-chart.jpg"]
+# Long side of the web-sized reference images.
+WEB_IMAGE_MAX_SIDE = 1000
+
+MANIFEST = "manifest.json"
+
+logger = logging.getLogger("fashionai.assets")
+
+
+def profile_key(skin_tone, undertone, gender, outfit):
+    return "|".join((skin_tone, undertone, gender, outfit))
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def source_hash(images=REFERENCE_IMAGES):
+    """Hash of everything the bundle's contents are derived from."""
+    # The renderer is hashed as source, so any edit to it (not only its
+    # constants) invalidates the swatches, without importing PIL here.
+    with open(os.path.join(ROOT, "palette_render.py"), "rb") as f:
+        renderer = f.read()
+    sources = {
+        "palettes": sorted([list(key), palette] for key, palette in category_palettes.items()),
+        "default": DEFAULT_PALETTE,
+        "renderer": _digest(renderer),
+        "images": list(images),
+        "web_image_max_side": WEB_IMAGE_MAX_SIDE,
+    }
+    return _digest(json.dumps(sources, sort_keys=True).encode())
+
+
+def _write(out_dir, subdir, data, suffix):
+    """Write ``data`` under its content hash; returns the path relative to ``out_dir``."""
+    name = f"{subdir}/{_digest(data)}{suffix}"
+    path = os.path.join(out_dir, name)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+    return name
+
+
+def _palette_entry(out_dir, rgb_palette):
+    from analysis import rgb_to_hex
+    from palette_render import palette_png
+
+    hex_colors = [rgb_to_hex(c) for c in rgb_palette]
+    data = json.dumps({"palette": hex_colors}).encode()
+    return {
+        "hex": hex_colors,
+        "png": _write(out_dir, "palettes", palette_png(hex_colors), ".png"),
+        "json": _write(out_dir, "palettes", data, ".json"),
+    }
+
+
+def _image_entry(out_dir, path, max_side=WEB_IMAGE_MAX_SIDE):
+    from PIL import Image
+
+    with Image.open(path) as img:
+        img = img.convert("RGB")
+        img.thumbnail((max_side, max_side), Image.LANCZOS)
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=85, optimize=True, progressive=True)
+        return {"path": _write(out_dir, "images", buf.getvalue(), ".jpg"), "width": img.width, "height": img.height}
+
+
+def build_bundle(out_dir=BUNDLE_DIR, images=REFERENCE_IMAGES):
+    manifest = {
+        "sources": source_hash(images),
+        "palettes": {profile_key(*key): _palette_entry(out_dir, palette) for key, palette in category_palettes.items()},
+        "default": _palette_entry(out_dir, DEFAULT_PALETTE),
+        "images": {name: _image_entry(out_dir, os.path.join(ROOT, name)) for name in images},
+    }
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    return manifest
+
+
+class AssetBundle:
+    def __init__(self, root=BUNDLE_DIR, url_prefix=BUNDLE_URL):
+        self.root = root
+        self.url_prefix = url_prefix
+        with open(os.path.join(root, MANIFEST)) as f:
+            manifest = json.load(f)
+        self.sources = manifest.get("sources")
+        self.palettes = manifest["palettes"]
+        self.default = manifest["default"]
+        self.images = manifest["images"]
+
+    def palette(self, skin_tone, undertone, gender, outfit):
+        """Manifest entry (``hex``, ``png``, ``json``) for a profile, or the default palette."""
+        return self.palettes.get(profile_key(skin_tone, undertone, gender, outfit), self.default)
+
+    def url(self, relative_path):
+        digest = os.path.splitext(os.path.basename(relative_path))[0]
+        return f"{self.url_prefix}/{relative_path}?v={digest}"
+
+    def read(self, relative_path):
+        with open(os.path.join(self.root, relative_path), "rb") as f:
+            return f.read()
+
+    def image_url(self, name):
+        return self.url(self.images[name]["path"])
+
+
+def load_bundle(root=BUNDLE_DIR):
+    """The built bundle, or None when ``asset_bundle.py`` has not been run or is out of date."""
+    if not os.path.exists(os.path.join(root, MANIFEST)):
+        return None
+    bundle = AssetBundle(root)
+    if bundle.sources != source_hash():
+        logger.warning("Asset bundle in %s was built from other palettes or renderer settings; "
+                       "ignoring it (rebuild with python asset_bundle.py)", root)
+        return None
+    return bundle
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute palette swatches and web-sized images.")
+    parser.add_argument("--out", default=BUNDLE_DIR)
+    args = parser.parse_args(argv)
+    manifest = build_bundle(args.out)
+    files = {e["png"] for e in manifest["palettes"].values()}
+    print(f"{len(manifest['palettes'])} profiles ({len(files)} distinct swatches), "
+          f"{len(manifest['images'])} images -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
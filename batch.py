@@ -0,0 +1,125 @@
+"""Headless batch skin analysis.
+
+Runs every image from a directory or manifest through the analysis pipeline on a
+process pool and writes one JSON record per image:
+
+    python batch.py photos/ -o results.jsonl
+    python batch.py manifest.csv -o results.jsonl --workers 8
+
+A manifest is either a plain text file with one path per line or a CSV with a
+``path`` column and optional ``gender`` / ``occasion`` columns.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from dominant_color import DEFAULT_STRATEGY, STRATEGIES
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+
+def iter_jobs(source, gender, occasion, strategy):
+    if os.path.isdir(source):
+        for root, _, files in os.walk(source):
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                    yield os.path.join(root, name), gender, occasion, strategy
+        return
+
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, newline="") as f:
+        if source.lower().endswith(".csv"):
+            for row in csv.DictReader(f):
+                path = row["path"]
+                if not os.path.isabs(path):
+                    path = os.path.join(base, path)
+                yield path, row.get("gender") or gender, row.get("occasion") or occasion, strategy
+        else:
+            for line in f:
+                path = line.strip()
+                if not path or path.startswith("#"):
+                    continue
+                if not os.path.isabs(path):
+                    path = os.path.join(base, path)
+                yield path, gender, occasion, strategy
+
+
+def _init_worker():
+    # One pipeline per core: keep OpenCV from spawning its own thread pool in
+    # every worker process.
+    import cv2
+    cv2.setNumThreads(1)
+
+
+def process_one(job):
+    from analysis import PaletteModel, analyze_image, load_image, suggest_colors
+    from image_decode import DECODE_MAX_SIDE
+    from metrics import Trace
+
+    path, gender, occasion, strategy = job
+    record = {"path": path, "gender": gender, "occasion": occasion}
+    trace = Trace("batch")
+    t0 = time.perf_counter()
+    try:
+        with trace.stage("load_image"):
+            img_bgr = load_image(path, DECODE_MAX_SIDE)
+        result = analyze_image(img_bgr, strategy=strategy, trace=trace)
+        if result is None:
+            record["status"] = "no_face"
+        else:
+            with trace.stage("suggest_colors"):
+                palette = suggest_colors(result["skin_tone"], result["undertone"], gender, occasion, PaletteModel())
+            record.update(result)
+            record["palette"] = palette
+            record["status"] = "ok"
+    except Exception as exc:
+        record["status"] = "error"
+        record["error"] = f"{type(exc).__name__}: {exc}"
+    record["timings_ms"] = dict(trace.timings)
+    record["total_ms"] = (time.perf_counter() - t0) * 1000
+    return record
+
+
+def run(source, output, workers=None, gender="Unisex", occasion="Daily", chunksize=16,
+        strategy=DEFAULT_STRATEGY):
+    jobs = iter_jobs(source, gender, occasion, strategy)
+    counts = {"ok": 0, "no_face": 0, "error": 0}
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        for record in pool.map(process_one, jobs, chunksize=chunksize):
+            output.write(json.dumps(record) + "\n")
+            counts[record["status"]] += 1
+    counts["elapsed_s"] = time.perf_counter() - t0
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch skin tone analysis over a directory or manifest of images.")
+    parser.add_argument("source", help="image directory, text manifest (one path per line) or CSV manifest with a 'path' column")
+    parser.add_argument("-o", "--output", default="-", help="JSON Lines output file (default: stdout)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--gender", default="Unisex", choices=["Male", "Female", "Unisex"])
+    parser.add_argument("--occasion", default="Daily", choices=["Casual", "Formal", "Party", "Festive", "Daily"])
+    parser.add_argument("--strategy", default=DEFAULT_STRATEGY, choices=STRATEGIES, help="dominant color strategy")
+    parser.add_argument("--chunksize", type=int, default=16, help="images handed to a worker at a time")
+    args = parser.parse_args(argv)
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        counts = run(args.source, out, args.workers, args.gender, args.occasion, args.chunksize, args.strategy)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(
+        f"{counts['ok']} analyzed, {counts['no_face']} without a face, {counts['error']} failed "
+        f"in {counts['elapsed_s']:.1f}s",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
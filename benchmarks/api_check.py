@@ -0,0 +1,175 @@
+"""Regression check for api_server.py, run against a live server.
+
+The checks start servers with ``run_in_background()`` and talk to them over a
+socket, covering the request parser's 400/411/413 answers, 429 backpressure
+when the image pool is full, and isolation of a failing item inside a shared
+palette micro-batch.
+
+    python -m benchmarks.api_check
+
+Exits with status 1 when any check fails.
+"""
+import argparse
+import asyncio
+import json
+import socket
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from api_server import MAX_BODY_BYTES, MAX_HEADER_BYTES, MicroBatcher, run_in_background
+
+PROFILE = {"skin_tone": "Tan", "undertone": "Warm", "gender": "Male", "occasion": "Daily"}
+
+
+def raw_request(base, data, timeout=30):
+    """Send raw request bytes; returns (status, parsed JSON body)."""
+    url = urlsplit(base)
+    with socket.create_connection((url.hostname, url.port), timeout=timeout) as sock:
+        sock.sendall(data)
+        response = b""
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            response += chunk
+            head, sep, body = response.partition(b"\r\n\r\n")
+            if sep:
+                headers = dict(line.split(": ", 1) for line in head.decode("latin-1").split("\r\n")[1:])
+                if len(body) >= int(headers.get("Content-Length", 0)):
+                    break
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split(b" ", 2)[1]), json.loads(body or b"null")
+
+
+def post(base, path, body, headers=()):
+    if not isinstance(body, bytes):
+        body = json.dumps(body).encode()
+    lines = [f"POST {path} HTTP/1.1", "Host: test", "Connection: close", f"Content-Length: {len(body)}", *headers]
+    return raw_request(base, ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+
+
+def _expect(status, expected, what):
+    if status != expected:
+        raise AssertionError(f"{what}: expected {expected}, got {status}")
+
+
+def check_parser(base):
+    status, _ = raw_request(base, b"GARBAGE\r\n\r\n")
+    _expect(status, 400, "malformed request line")
+    for length in ("abc", "-5"):
+        status, _ = raw_request(base, f"POST /v1/palette HTTP/1.1\r\nContent-Length: {length}\r\n\r\n".encode())
+        _expect(status, 400, f"Content-Length {length}")
+    status, _ = raw_request(base, b"POST /v1/palette HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n")
+    _expect(status, 411, "chunked body")
+    status, _ = raw_request(base, f"POST /v1/analyze HTTP/1.1\r\nContent-Length: {MAX_BODY_BYTES + 1}\r\n\r\n".encode())
+    _expect(status, 413, "oversized body")
+    status, _ = raw_request(base, b"GET /healthz HTTP/1.1\r\nX-Pad: " + b"a" * MAX_HEADER_BYTES + b"\r\n\r\n")
+    _expect(status, 413, "oversized headers")
+    status, _ = post(base, "/v1/palette", b"{not json")
+    _expect(status, 400, "invalid JSON")
+    status, _ = post(base, "/v1/palette", dict(PROFILE, skin_tone=["a"]))
+    _expect(status, 400, "non-string profile field")
+    status, _ = post(base, "/v1/analyze", b"not an image")
+    _expect(status, 400, "undecodable image")
+
+
+def check_match_k(base):
+    for k in (0, -3):
+        status, _ = post(base, "/v1/match", dict(PROFILE, k=k))
+        _expect(status, 400, f"k={k}")
+
+
+def check_backpressure():
+    # One analysis thread held busy, one image slot: the first image takes the
+    # slot and waits, the second is turned away.
+    release = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=1)
+    executor.submit(release.wait)
+    try:
+        with run_in_background(executor=executor, max_queue=1) as base:
+            with ThreadPoolExecutor(max_workers=1) as client:
+                first = client.submit(post, base, "/v1/analyze", b"not an image")
+                status, _ = _wait_for_in_flight(base, first)
+                _expect(status, 429, "image beyond max_queue")
+                release.set()
+                _expect(first.result()[0], 400, "queued image after release")
+    finally:
+        release.set()
+        executor.shutdown()
+
+
+def _wait_for_in_flight(base, first):
+    # The first request is in flight once its connection is accepted and read;
+    # retry the second until it is rejected or the first one finishes.
+    for _ in range(200):
+        status, body = post(base, "/v1/analyze", b"not an image")
+        if status == 429 or first.done():
+            return status, body
+        time.sleep(0.01)
+    return status, body
+
+
+def check_palette_batch(base):
+    bad = dict(PROFILE, skin_tone=["a"])
+    with ThreadPoolExecutor(max_workers=5) as client:
+        results = list(client.map(lambda p: post(base, "/v1/palette", p), [PROFILE] * 4 + [bad]))
+    for status, _ in results[:4]:
+        _expect(status, 200, "valid profile sharing a batch with a bad one")
+    _expect(results[4][0], 400, "bad profile in a shared batch")
+
+
+def check_batch_isolation():
+    async def handler(items):
+        if "bad" in items:
+            raise TypeError("bad item")
+        return [item.upper() for item in items]
+
+    async def run():
+        batcher = MicroBatcher(handler, max_wait=0.05)
+        batcher.start()
+        try:
+            return await asyncio.gather(*(batcher.submit(x) for x in ("a", "b", "bad", "c")),
+                                        return_exceptions=True)
+        finally:
+            await batcher.stop()
+
+    results = asyncio.run(run())
+    if results[:2] + results[3:] != ["A", "B", "C"] or not isinstance(results[2], TypeError):
+        raise AssertionError(f"batch isolation: got {results!r}")
+
+
+SERVER_CHECKS = [check_parser, check_match_k, check_palette_batch]
+STANDALONE_CHECKS = [check_backpressure, check_batch_isolation]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check api_server.py request handling end to end.")
+    parser.parse_args(argv)
+
+    failed = []
+
+    def run(check, *args):
+        try:
+            check(*args)
+            print(f"ok    {check.__name__}")
+        except Exception:
+            failed.append(check.__name__)
+            print(f"FAIL  {check.__name__}\n{traceback.format_exc()}", file=sys.stderr)
+
+    with run_in_background(max_wait=0.05) as base:
+        for check in SERVER_CHECKS:
+            run(check, base)
+    for check in STANDALONE_CHECKS:
+        run(check)
+    if failed:
+        print(f"FAIL: {len(failed)} check(s) failed: {', '.join(failed)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""Garment matching benchmark on a synthetic catalogue.
+
+Builds a catalogue of random SKUs (uniform sRGB colours, random gender and one
+or two occasions), times the Lab conversion and index build, then times
+``GarmentCatalogue.match`` for every palette profile and checks each answer
+against a brute-force ΔE scan of the same partition filter.
+
+    python -m benchmarks.catalogue --size 300000
+    python -m benchmarks.catalogue --write /tmp/garments.csv
+"""
+import argparse
+import time
+
+import numpy as np
+
+from palette_index import GENDERS, OCCASIONS
+
+
+def synthetic_catalogue(size, seed=0):
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    rgb = rng.integers(0, 256, (size, 3))
+    first = rng.choice(OCCASIONS, size)
+    second = rng.choice(OCCASIONS + [""] * len(OCCASIONS), size)
+    occasion = np.where((second != "") & (second != first), np.char.add(np.char.add(first, "|"), second), first)
+    # About one garment in ten is suitable for any occasion.
+    occasion = np.where(rng.random(size) < 0.1, "", occasion)
+    return pd.DataFrame({
+        "sku": np.char.add("SKU", np.arange(size).astype(str)),
+        "color": ["#%02x%02x%02x" % tuple(c) for c in rgb],
+        "gender": rng.choice(GENDERS, size),
+        "occasion": occasion,
+    })
+
+
+def brute_force(catalogue, palette, gender, occasion, k, max_delta_e):
+    """Reference answer: filter the raw columns and scan every remaining garment."""
+    from garment_catalogue import UNISEX, hex_to_rgb_array, rgb_to_lab
+
+    frame = catalogue.frame
+    occasions = frame["occasion"].fillna("")
+    keep = frame["gender"].isin([gender, UNISEX]) & (occasions.str.contains(occasion, regex=False) | (occasions == ""))
+    rows = np.flatnonzero(keep.to_numpy())
+    targets = rgb_to_lab(hex_to_rgb_array(palette))
+    dist = np.linalg.norm(catalogue.lab[rows][:, None, :] - targets[None], axis=-1).min(axis=1)
+    order = np.argsort(dist, kind="stable")[:k]
+    return [(str(catalogue.frame["sku"].iat[rows[i]]), round(float(dist[i]), 2))
+            for i in order if dist[i] <= max_delta_e]
+
+
+def main(argv=None):
+    from analysis import PaletteModel, suggest_colors
+    from garment_catalogue import MAX_DELTA_E, GarmentCatalogue
+    from palette_index import SKIN_TONES, UNDERTONES
+
+    parser = argparse.ArgumentParser(description="Benchmark palette-to-catalogue matching.")
+    parser.add_argument("--size", type=int, default=300000)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--max-delta-e", type=float, default=MAX_DELTA_E)
+    parser.add_argument("--write", metavar="CSV", help="only write the synthetic catalogue to this file")
+    args = parser.parse_args(argv)
+
+    frame = synthetic_catalogue(args.size)
+    if args.write:
+        frame.to_csv(args.write, index=False)
+        return 0
+
+    t0 = time.perf_counter()
+    catalogue = GarmentCatalogue(frame)
+    build_ms = (time.perf_counter() - t0) * 1000
+
+    model = PaletteModel()
+    times, mismatches, queries = [], 0, 0
+    for tone in SKIN_TONES:
+        for undertone in UNDERTONES:
+            for gender in GENDERS:
+                for occasion in OCCASIONS:
+                    palette = suggest_colors(tone, undertone, gender, occasion, model)
+                    t0 = time.perf_counter()
+                    matches = catalogue.match(palette, gender, occasion, args.k, args.max_delta_e)
+                    times.append((time.perf_counter() - t0) * 1000)
+                    expected = brute_force(catalogue, palette, gender, occasion, args.k, args.max_delta_e)
+                    got = [(m["sku"], m["delta_e"]) for m in matches]
+                    # Ties at equal distance may come back in either order.
+                    mismatches += [d for _, d in got] != [d for _, d in expected]
+                    queries += 1
+
+    print(f"{len(catalogue)} garments, {len(catalogue.partitions)} partitions, built in {build_ms:.0f} ms")
+    print(f"{queries} queries (k={args.k}, ΔE <= {args.max_delta_e}): "
+          f"p50 {np.percentile(times, 50):.2f} ms, p95 {np.percentile(times, 95):.2f} ms")
+    print(f"mismatches against brute force: {mismatches}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    import sys
+
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""Cold-start profile and regression check for app.py.
+
+Each mode is rendered once in a fresh interpreter through Streamlit's headless
+AppTest driver, the way a new pod serves its first request. The report lists the
+time to import Streamlit, the time to the first full render of the mode, a
+warm rerun for comparison, which heavy libraries the mode pulled in, and the
+slowest imports (from ``python -X importtime``).
+
+    python -m benchmarks.cold_start
+    python -m benchmarks.cold_start --budget-ms 800 --repeat 3
+
+Exits with status 1 when the median first render of any mode exceeds the budget.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "app.py")
+
+MODES = {
+    "1": "1️⃣ Upload Image to Generate Report",
+    "2": "2️⃣ Manual Input Color Suggestion",
+    "3": "3️⃣ Educational Universal Report",
+}
+
+HEAVY_MODULES = ("cv2", "sklearn", "scipy", "pandas", "matplotlib", "joblib")
+
+# Default budget for the first render of a mode, excluding the Streamlit import.
+DEFAULT_BUDGET_MS = 750
+
+_CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+t1 = time.perf_counter()
+heavy_before = set(m for m in sys.argv[3].split(",") if m in sys.modules)
+at = AppTest.from_file(sys.argv[1], default_timeout=120)
+at.session_state["mode"] = sys.argv[2]
+at.run()
+t2 = time.perf_counter()
+if at.exception:
+    raise SystemExit(str(at.exception))
+at.run()
+t3 = time.perf_counter()
+print(json.dumps({
+    "streamlit_import_ms": (t1 - t0) * 1000,
+    "first_render_ms": (t2 - t1) * 1000,
+    "rerun_ms": (t3 - t2) * 1000,
+    "heavy_imports": sorted(m for m in sys.argv[3].split(",") if m in sys.modules and m not in heavy_before),
+}))
+"""
+
+
+def _parse_importtime(stderr, top):
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        # Nested imports are indented; keep only the top-level ones.
+        if name[1:].startswith(" "):
+            continue
+        rows.append((int(cumulative_us) / 1000, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def measure(mode, importtime=False):
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ["-X", "importtime"]
+    cmd += ["-c", _CHILD, APP, MODES[mode], ",".join(HEAVY_MODULES)]
+    proc = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"mode {mode} failed to render:\n{proc.stderr[-2000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    if importtime:
+        result["slowest_imports"] = _parse_importtime(proc.stderr, 10)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure app.py cold-start time per mode.")
+    parser.add_argument("--modes", default="123", help="modes to measure, e.g. 23")
+    parser.add_argument("--repeat", type=int, default=3, help="fresh interpreters per mode")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help="fail when the median first render exceeds this")
+    parser.add_argument("--json", action="store_true", help="print the raw results as JSON")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for mode in args.modes:
+        runs = [measure(mode, importtime=(i == 0)) for i in range(args.repeat)]
+        results[mode] = {
+            "streamlit_import_ms": statistics.median(r["streamlit_import_ms"] for r in runs),
+            "first_render_ms": statistics.median(r["first_render_ms"] for r in runs),
+            "rerun_ms": statistics.median(r["rerun_ms"] for r in runs),
+            "heavy_imports": runs[0]["heavy_imports"],
+            "slowest_imports": runs[0]["slowest_imports"],
+        }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for mode, r in results.items():
+            print(f"mode {mode}: streamlit import {r['streamlit_import_ms']:.0f} ms, "
+                  f"first render {r['first_render_ms']:.0f} ms, rerun {r['rerun_ms']:.0f} ms")
+            print(f"  heavy imports: {', '.join(r['heavy_imports']) or 'none'}")
+            for ms, name in r["slowest_imports"]:
+                print(f"  {ms:8.1f} ms  {name}")
+
+    over = [m for m, r in results.items() if r["first_render_ms"] > args.budget_ms]
+    if over:
+        print(f"FAIL: first render over {args.budget_ms:.0f} ms budget in mode(s) {', '.join(over)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
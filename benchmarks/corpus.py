@@ -0,0 +1,141 @@
+"""Deterministic synthetic image corpus for benchmarks.
+
+Cartoon faces are rendered with OpenCV in six skin tones at three
+resolutions (VGA, 1080p and a 12 MP phone frame), plus plain skin patches with
+no face, and the two reference JPGs bundled with the app. Everything is
+generated from fixed seeds and encoded as JPEG in memory, so every run sees the
+same bytes and the decode stage is exercised as it is for uploads.
+
+    python -m benchmarks.corpus --write /tmp/corpus   # dump to disk for batch.py
+"""
+import argparse
+import os
+from dataclasses import dataclass
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# RGB, light to dark.
+SKIN_TONES = {
+    "fair": (245, 222, 200),
+    "light": (225, 190, 160),
+    "medium": (200, 160, 120),
+    "olive": (170, 120, 85),
+    "brown": (120, 80, 55),
+    "deep": (70, 45, 30),
+}
+
+RESOLUTIONS = {
+    "vga": (640, 480),
+    "1080p": (1920, 1080),
+    "12mp": (4000, 3000),
+}
+
+BUNDLED_IMAGES = ["08d55e0b8465e292e4feb848b6b695f6.jpg", "march-Blog-skin-tone-color-chart.jpg"]
+
+
+@dataclass
+class CorpusImage:
+    name: str
+    data: bytes
+    # Rendered face/patch box (x, y, w, h) and the rendered (width, height);
+    # None for the bundled photos.
+    box: tuple = None
+    size: tuple = None
+
+
+def render_face(width, height, skin_rgb, seed=0):
+    """Draw a blurred cartoon face on a flat background; returns (BGR image, face box)."""
+    import cv2
+
+    rng = np.random.default_rng(seed)
+    img = np.empty((height, width, 3), dtype=np.uint8)
+    img[:] = rng.integers(90, 200, 3).tolist()
+    s = min(width, height) / 480
+    cx, cy = width // 2, int(height * 0.45)
+    fw, fh = int(110 * s), int(140 * s)
+    skin = tuple(int(c) for c in skin_rgb[::-1])
+
+    def pt(dx, dy):
+        return cx + int(dx * s), cy + int(dy * s)
+
+    def axes(ax, ay):
+        return int(ax * s), int(ay * s)
+
+    cv2.rectangle(img, pt(-50, 100), (cx + int(50 * s), height), skin, -1)  # neck
+    cv2.ellipse(img, pt(0, -30), axes(120, 130), 0, 180, 360, (30, 30, 40), -1)  # hair
+    cv2.ellipse(img, (cx, cy), (fw, fh), 0, 0, 360, skin, -1)
+    for dx in (-45, 45):
+        cv2.ellipse(img, pt(dx, -25), axes(22, 10), 0, 0, 360, (60, 50, 50), -1)  # eyes
+        cv2.ellipse(img, pt(dx, -48), axes(26, 6), 0, 0, 360, (40, 35, 35), -1)  # brows
+    cv2.ellipse(img, pt(0, 20), axes(10, 25), 0, 0, 360, tuple(int(c * 0.8) for c in skin), -1)  # nose
+    cv2.ellipse(img, pt(0, 70), axes(35, 10), 0, 0, 360, (70, 60, 150), -1)  # mouth
+
+    img = cv2.GaussianBlur(img, (0, 0), 3 * s)
+    # float32, summed in place: a float64 noise frame at 12 MP alone is ~290 MB.
+    noisy = rng.standard_normal(img.shape, dtype=np.float32)
+    noisy *= 4
+    noisy += img
+    img = np.clip(noisy, 0, 255, out=noisy).astype(np.uint8)
+    return img, (cx - fw, cy - fh, 2 * fw, 2 * fh)
+
+
+def render_patch(size, skin_rgb, seed=0):
+    """Textured skin patch without a face; the whole frame is the box."""
+    import cv2
+
+    rng = np.random.default_rng(seed)
+    base = np.empty((size, size, 3), dtype=np.float32)
+    base[:] = skin_rgb[::-1]
+    shading = cv2.GaussianBlur(rng.normal(0, 12, (size, size)).astype(np.float32), (0, 0), size / 16)
+    img = base * (1 + shading[..., None] / 100) + rng.normal(0, 5, base.shape)
+    return np.clip(img, 0, 255).astype(np.uint8), (0, 0, size, size)
+
+
+def _encode(img_bgr, quality=90):
+    import cv2
+
+    ok, buf = cv2.imencode(".jpg", img_bgr, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise RuntimeError("JPEG encoding failed")
+    return buf.tobytes()
+
+
+def build_corpus(resolutions=RESOLUTIONS, tones=SKIN_TONES, patches=True, bundled=True):
+    items = []
+    for i, (tone, rgb) in enumerate(tones.items()):
+        for res, (w, h) in resolutions.items():
+            img, box = render_face(w, h, rgb, seed=i)
+            items.append(CorpusImage(f"face-{tone}-{res}", _encode(img), box, (w, h)))
+        if patches:
+            img, box = render_patch(512, rgb, seed=i)
+            items.append(CorpusImage(f"patch-{tone}", _encode(img), box, (512, 512)))
+    if bundled:
+        for name in BUNDLED_IMAGES:
+            with open(os.path.join(ROOT, name), "rb") as f:
+                items.append(CorpusImage(name, f.read()))
+    return items
+
+
+def write_corpus(items, directory):
+    """Write items as JPEG files under ``directory``; returns their paths."""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for item in items:
+        name = item.name if item.name.endswith(".jpg") else item.name + ".jpg"
+        paths.append(os.path.join(directory, name))
+        with open(paths[-1], "wb") as f:
+            f.write(item.data)
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write the synthetic benchmark corpus to a directory.")
+    parser.add_argument("--write", required=True, metavar="DIR")
+    args = parser.parse_args(argv)
+    write_corpus(build_corpus(), args.write)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+"""Concurrent-session load test for app.py, driven in-process by ``AppTest``.
+
+Each simulated user is an ``AppTest`` session on its own thread, all in one
+process, so ``st.cache_resource`` objects (palette index, analysis cache and
+pool) are shared between sessions as they are on a real server. Sessions replay
+a weighted mix of:
+
+* mode 1: upload a photo (from ``--images`` or the synthetic corpus), then
+  change occasion and gender, each a rerun;
+* mode 2: pick a profile, press "Generate Palette", and check the download
+  button carries the PNG;
+* mode 3: render the educational report.
+
+The report gives latency percentiles per (mode, interaction), rerun counts, CPU
+utilisation of this process and its children (the analysis workers), and RSS,
+thread and file-descriptor counts sampled over time, so leaks such as unclosed
+figures or a cascade loaded per rerun show up as growth:
+
+    python -m benchmarks.load_test --sessions 8 --duration 60
+    python -m benchmarks.load_test --sessions 4 --iterations 5 --mix 1=1 --images photos/
+
+Exits with status 1 when a session raised, or when --max-p95-ms /
+--max-rss-growth-mb is given and exceeded.
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, "app.py")
+
+UPLOAD_STATE_KEY = "_load_test_upload"
+GENDERS = ["Male", "Female", "Unisex"]
+OCCASIONS = ["Casual", "Formal", "Party", "Festive", "Daily"]
+SKIN_TONES = ["Very Dark", "Dark", "Tan", "Olive", "Medium", "Fair"]
+UNDERTONES = ["Cool", "Warm", "Neutral"]
+
+RUN_TIMEOUT = 120
+
+
+class _Upload(io.BytesIO):
+    name = "upload.jpg"
+    type = "image/jpeg"
+
+
+def install_harness():
+    """Make AppTest usable from several threads at once and feed it uploads.
+
+    AppTest swaps a mock Runtime in and out of a process-wide singleton around
+    every run; with concurrent sessions one run would clear it under another.
+    A shared fallback runtime covers those gaps. Each run also compiles the
+    script with a fresh cache, and concurrent ``compile()`` calls can fail on
+    Python 3.11; sessions share one cache, as they do on a real server.
+    ``st.file_uploader`` returns whatever a session put in
+    ``session_state[UPLOAD_STATE_KEY]``.
+    """
+    from unittest.mock import MagicMock
+
+    import streamlit as st
+    from streamlit import config
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.runtime.scriptrunner import script_run_context
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import local_script_runner
+
+    shared = MagicMock(spec=Runtime)
+    shared.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    shared.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime.instance = classmethod(lambda cls: cls._instance or shared)
+    Runtime.exists = classmethod(lambda cls: True)
+    # Outside script threads Streamlit now warns on every call; silence that.
+    logging.getLogger(script_run_context.__name__).addFilter(lambda record: record.levelno > logging.WARNING)
+    script_cache = ScriptCache()
+    local_script_runner.ScriptCache = lambda: script_cache
+    # Saved and restored around each run; keep it set for every session.
+    config.set_option("global.appTest", True)
+
+    original = st.file_uploader
+
+    def file_uploader(*args, **kwargs):
+        data = st.session_state.get(UPLOAD_STATE_KEY)
+        return original(*args, **kwargs) if data is None else _Upload(data)
+
+    st.file_uploader = file_uploader
+
+
+def load_images(directory=None, limit=None):
+    if directory:
+        names = sorted(n for n in os.listdir(directory) if n.lower().endswith((".jpg", ".jpeg", ".png")))
+        images = []
+        for name in names[:limit]:
+            with open(os.path.join(directory, name), "rb") as f:
+                images.append(f.read())
+        return images
+    from benchmarks.corpus import RESOLUTIONS, build_corpus
+
+    resolutions = {k: v for k, v in RESOLUTIONS.items() if k != "12mp"}
+    return [item.data for item in build_corpus(resolutions=resolutions, patches=False)][:limit]
+
+
+def _selectbox(at, label):
+    for box in at.selectbox:
+        if box.label == label:
+            return box
+    return None
+
+
+class Session:
+    def __init__(self, index, images, mix, recorder, seed=0):
+        from streamlit.testing.v1 import AppTest
+
+        self.index = index
+        self.images = images
+        self.modes, self.weights = zip(*mix.items())
+        self.recorder = recorder
+        self.rng = random.Random(seed * 1000 + index)
+        self.at = AppTest.from_file(APP_PATH, default_timeout=RUN_TIMEOUT)
+        self.reruns = 0
+        self.downloads = 0
+
+    def _run(self, mode, interaction):
+        t0 = time.perf_counter()
+        self.at.run()
+        self.reruns += 1
+        self.recorder.record(mode, interaction, (time.perf_counter() - t0) * 1000)
+        if self.at.exception:
+            raise RuntimeError(f"session {self.index}, mode {mode} {interaction}: {self.at.exception[0].message}")
+
+    def _set_mode(self, mode):
+        box = self.at.selectbox(key="mode")
+        option = next(o for o in box.options if o.startswith(mode))
+        if box.value != option:
+            box.set_value(option)
+            self._run(mode, "switch_mode")
+
+    def _choose(self, mode, label, options, interaction):
+        box = _selectbox(self.at, label)
+        if box is None:
+            return False
+        box.set_value(self.rng.choice([o for o in options if o != box.value] or options))
+        self._run(mode, interaction)
+        return True
+
+    def mode_1(self):
+        self.at.session_state[UPLOAD_STATE_KEY] = None
+        self._set_mode("1")
+        self.at.session_state[UPLOAD_STATE_KEY] = self.rng.choice(self.images)
+        self._run("1", "upload")
+        for _ in range(self.rng.randint(1, 3)):
+            if not self._choose("1", "Occasion", OCCASIONS, "change_occasion"):
+                return  # no face found: nothing to change
+        self._choose("1", "Select Gender", GENDERS, "change_gender")
+
+    def mode_2(self):
+        self.at.session_state[UPLOAD_STATE_KEY] = None
+        self._set_mode("2")
+        for label, options in (("Select Skin Tone", SKIN_TONES), ("Select Undertone", UNDERTONES),
+                               ("Occasion", OCCASIONS)):
+            self._choose("2", label, options, "select")
+        self.at.button[0].click()
+        self._run("2", "generate")
+        # A browser fetches the download itself; check the payload was produced.
+        if self.at.get("download_button"):
+            self.downloads += 1
+
+    def mode_3(self):
+        self.at.session_state[UPLOAD_STATE_KEY] = None
+        self._set_mode("3")
+        self._run("3", "render")
+
+    def run(self, stop, iterations=None):
+        self._run("start", "first_render")
+        done = 0
+        while not stop.is_set() and (iterations is None or done < iterations):
+            getattr(self, "mode_" + self.rng.choices(self.modes, self.weights)[0])()
+            done += 1
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+
+    def record(self, mode, interaction, ms):
+        with self._lock:
+            self.latencies[(mode, interaction)].append(ms)
+
+
+def _children_cpu_seconds():
+    # Linux: sum CPU time of live child processes (the analysis pool workers).
+    total = 0.0
+    ticks = os.sysconf("SC_CLK_TCK")
+    me = str(os.getpid())
+    try:
+        pids = [p for p in os.listdir("/proc") if p.isdigit()]
+    except OSError:
+        return 0.0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if fields[1] == me:
+            total += (int(fields[11]) + int(fields[12])) / ticks
+    return total
+
+
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _open_fds():
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return None
+
+
+class Sampler(threading.Thread):
+    def __init__(self, interval=1.0):
+        super().__init__(name="load-test-sampler", daemon=True)
+        self.interval = interval
+        self.samples = []
+        self._stop_event = threading.Event()
+
+    def sample(self):
+        figures = None
+        if "matplotlib.pyplot" in sys.modules:
+            figures = len(sys.modules["matplotlib.pyplot"].get_fignums())
+        self.samples.append({
+            "t": time.perf_counter(),
+            "cpu_s": time.process_time(),
+            "children_cpu_s": _children_cpu_seconds(),
+            "rss_mb": _rss_mb(),
+            "threads": threading.active_count(),
+            "fds": _open_fds(),
+            "figures": figures,
+        })
+
+    def run(self):
+        self.sample()
+        while not self._stop_event.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.sample()
+
+
+def summarize(recorder, sampler, sessions, elapsed):
+    latencies = {
+        f"mode {mode} {interaction}": {
+            "n": len(v),
+            "p50_ms": float(np.percentile(v, 50)),
+            "p95_ms": float(np.percentile(v, 95)),
+            "p99_ms": float(np.percentile(v, 99)),
+        }
+        for (mode, interaction), v in sorted(recorder.latencies.items())
+    }
+    first, last = sampler.samples[0], sampler.samples[-1]
+    wall = last["t"] - first["t"] or 1e-9
+    cores = os.cpu_count() or 1
+    rss = [s["rss_mb"] for s in sampler.samples]
+    # RSS growth after warm-up: compare the last sample with the one a quarter in.
+    warm = sampler.samples[len(sampler.samples) // 4]
+    return {
+        "sessions": len(sessions),
+        "elapsed_s": elapsed,
+        "reruns": sum(s.reruns for s in sessions),
+        "reruns_per_s": sum(s.reruns for s in sessions) / elapsed,
+        "downloads_ready": sum(s.downloads for s in sessions),
+        "latency": latencies,
+        "cpu_utilisation": (last["cpu_s"] - first["cpu_s"]) / wall / cores,
+        "children_cpu_utilisation": (last["children_cpu_s"] - first["children_cpu_s"]) / wall / cores,
+        "rss_mb": {"start": rss[0], "peak": max(rss), "end": rss[-1]},
+        "rss_growth_after_warmup_mb": last["rss_mb"] - warm["rss_mb"],
+        "threads": {"start": first["threads"], "end": last["threads"]},
+        "fds": {"start": first["fds"], "end": last["fds"]},
+        "matplotlib_figures": last["figures"],
+        "timeline": [{k: (round(v, 3) if isinstance(v, float) else v) for k, v in s.items()}
+                     for s in sampler.samples],
+    }
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        mode, _, weight = part.partition("=")
+        if mode.strip() not in ("1", "2", "3"):
+            raise argparse.ArgumentTypeError(f"unknown mode {mode!r} in --mix")
+        mix[mode.strip()] = float(weight or 1)
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate concurrent app sessions and report latency and resources.")
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=60, help="seconds to run (ignored with --iterations)")
+    parser.add_argument("--iterations", type=int, default=None, help="scenarios per session instead of a duration")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("1=0.5,2=0.3,3=0.2"),
+                        help="mode weights, e.g. 1=0.5,2=0.3,3=0.2")
+    parser.add_argument("--images", default=None, help="directory of photos to upload (default: synthetic corpus)")
+    parser.add_argument("--sample-interval", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-p95-ms", type=float, default=None, help="fail if any interaction's p95 exceeds this")
+    parser.add_argument("--max-rss-growth-mb", type=float, default=None, help="fail if RSS grows more than this after warm-up")
+    parser.add_argument("--json", metavar="FILE", help="also write the full report, with the timeline, to FILE")
+    args = parser.parse_args(argv)
+
+    os.chdir(ROOT)  # app.py opens its reference images by relative path
+    install_harness()
+    images = load_images(args.images)
+    recorder = Recorder()
+    sessions = [Session(i, images, args.mix, recorder, args.seed) for i in range(args.sessions)]
+    stop = threading.Event()
+    errors = []
+
+    def drive(session):
+        try:
+            session.run(stop, args.iterations)
+        except Exception as exc:
+            errors.append(f"{type(exc).__name__}: {exc}")
+            stop.set()
+
+    sampler = Sampler(args.sample_interval)
+    sampler.start()
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=drive, args=(s,), name=f"session-{s.index}") for s in sessions]
+    for t in threads:
+        t.start()
+    if args.iterations is None:
+        stop.wait(args.duration)
+        stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    sampler.stop()
+
+    report = summarize(recorder, sampler, sessions, elapsed)
+    report["errors"] = errors
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    print(f"{report['sessions']} sessions, {elapsed:.1f}s, {report['reruns']} reruns "
+          f"({report['reruns_per_s']:.1f}/s), {report['downloads_ready']} downloads ready")
+    print(f"{'interaction':<28}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, row in report["latency"].items():
+        print(f"{name:<28}{row['n']:>6}{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}")
+    print(f"CPU: app process {report['cpu_utilisation']:.0%}, analysis workers "
+          f"{report['children_cpu_utilisation']:.0%} of {os.cpu_count()} cores")
+    rss = report["rss_mb"]
+    print(f"RSS: {rss['start']:.0f} -> {rss['end']:.0f} MB (peak {rss['peak']:.0f}, "
+          f"{report['rss_growth_after_warmup_mb']:+.1f} MB after warm-up); threads "
+          f"{report['threads']['start']} -> {report['threads']['end']}; fds {report['fds']['start']} -> {report['fds']['end']}"
+          + (f"; open matplotlib figures {report['matplotlib_figures']}" if report["matplotlib_figures"] is not None else ""))
+
+    failed = bool(errors)
+    for error in errors:
+        print(f"ERROR {error}", file=sys.stderr)
+    if args.max_p95_ms is not None:
+        for name, row in report["latency"].items():
+            if row["p95_ms"] > args.max_p95_ms:
+                print(f"FAIL: {name} p95 {row['p95_ms']:.0f} ms > {args.max_p95_ms:.0f} ms", file=sys.stderr)
+                failed = True
+    if args.max_rss_growth_mb is not None and report["rss_growth_after_warmup_mb"] > args.max_rss_growth_mb:
+        print(f"FAIL: RSS grew {report['rss_growth_after_warmup_mb']:.1f} MB after warm-up", file=sys.stderr)
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
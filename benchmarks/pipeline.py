@@ -0,0 +1,252 @@
+"""Per-stage latency benchmark and classification regression check.
+
+Every corpus image is pushed through each pipeline stage separately, several
+times, in a single process with OpenCV pinned to one thread, so the numbers are
+per-core. Downstream stages run on the detected face box, or on the rendered
+box when the cascade misses. The report gives p50/p95 per stage, the
+whole-pipeline throughput per core and the pipeline's memory: peak RSS of a
+fresh process that reads the corpus from disk one file at a time and analyses
+it, and how far that peak rose above the same process after a warm-up image.
+Measuring in this process would report the corpus build instead.
+
+The classification check runs ``analyze_image`` on every image (classifying
+the skin sampled from the rendered box when the cascade misses, so every
+rendered tone is covered) and compares (tone, undertone) with
+benchmarks/baseline.json, so a speedup that changes
+``classify_skin``/``estimate_undertone`` results is flagged:
+
+    python -m benchmarks.pipeline                     # report + agreement check
+    python -m benchmarks.pipeline --quick             # VGA/1080p only, fewer repeats
+    python -m benchmarks.pipeline --update-baseline   # accept current outputs
+
+Exits with status 1 when agreement with the baseline is below --min-agreement.
+"""
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.corpus import RESOLUTIONS, build_corpus, write_corpus
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+STAGES = ("load_image", "detect_face", "sample_skin", "extract_skin", "dominant_color", "classify", "render_palette")
+
+_RSS_CHILD = r"""
+import json, resource, sys
+from analysis import analyze_image, load_image
+from image_decode import DECODE_MAX_SIDE
+
+def rss_mb():
+    # ru_maxrss survives fork + exec on Linux, so it would start at the
+    # parent's peak; VmHWM belongs to this process image alone.
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def analyze(path):
+    with open(path, "rb") as f:
+        analyze_image(load_image(f.read(), DECODE_MAX_SIDE))
+
+analyze(sys.argv[1])  # warm-up: lazy imports, cascade
+warm = rss_mb()
+for path in sys.argv[2:]:
+    analyze(path)
+print(json.dumps({"warm_rss_mb": warm, "peak_rss_mb": rss_mb()}))
+"""
+
+
+def _timed(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, (time.perf_counter() - t0) * 1000
+
+
+def rendered_box(item, img):
+    """The corpus item's rendered face box in the coordinates of the (possibly reduced) decode."""
+    if item.box is None:
+        return None
+    scale = img.shape[1] / item.size[0]
+    return tuple(int(v * scale) for v in item.box)
+
+
+def time_stages(item, detector):
+    from analysis import (
+        PaletteModel, classify_skin, estimate_undertone, extract_skin,
+        get_dominant_color, load_image, suggest_colors,
+    )
+    from image_decode import DECODE_MAX_SIDE
+    from palette_render import render_palette
+    from skin_sampling import sample_skin
+
+    times = {}
+    img, times["load_image"] = _timed(load_image, item.data, DECODE_MAX_SIDE)
+    box, times["detect_face"] = _timed(detector.largest, img)
+    if box is None:
+        box = rendered_box(item, img)
+    if box is None:
+        return times
+    x, y, w, h = box
+    pixels, times["sample_skin"] = _timed(sample_skin, img, box)
+    _, times["extract_skin"] = _timed(extract_skin, img[y:y + h, x:x + w])
+    if len(pixels) < 3:
+        return times
+    dominant, times["dominant_color"] = _timed(get_dominant_color, pixels)
+    (tone, undertone), times["classify"] = _timed(lambda c: (classify_skin(c), estimate_undertone(c)), dominant)
+    hex_colors = suggest_colors(tone, undertone, "Unisex", "Daily", PaletteModel())
+
+    def render(colors):
+        # Uncached on purpose: measures the cost of a palette's first render.
+        render_palette(colors).save(io.BytesIO(), format="PNG", optimize=True)
+
+    _, times["render_palette"] = _timed(render, hex_colors)
+    return times
+
+
+def classify_corpus(items, detector):
+    from analysis import analyze_image, classify_skin, estimate_undertone, get_dominant_color, load_image
+    from image_decode import DECODE_MAX_SIDE
+    from skin_sampling import sample_skin
+
+    results = {}
+    for item in items:
+        img = load_image(item.data, DECODE_MAX_SIDE)
+        result = analyze_image(img, detector)
+        if result is not None:
+            results[item.name] = [result["skin_tone"], result["undertone"]]
+            continue
+        # Cascade miss (patches, very dark faces): classify the rendered box the
+        # same way, so the dark end of the tone scale is still checked.
+        box = rendered_box(item, img)
+        pixels = sample_skin(img, box) if box is not None else []
+        if len(pixels) < 3:
+            results[item.name] = None
+            continue
+        dominant = get_dominant_color(pixels)
+        results[item.name] = [classify_skin(dominant), estimate_undertone(dominant)]
+    return results
+
+
+def compare_to_baseline(results, baseline):
+    common = [name for name in results if name in baseline]
+    mismatches = {name: {"baseline": baseline[name], "current": results[name]}
+                  for name in common if baseline[name] != results[name]}
+    agreement = 1.0 - len(mismatches) / len(common) if common else 1.0
+    return agreement, mismatches
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else float("nan")
+
+
+def run(items, repeat=5):
+    import cv2
+
+    from face_detector import FaceDetector
+
+    cv2.setNumThreads(1)
+    detector = FaceDetector()
+    samples = {stage: [] for stage in STAGES}
+    totals = []
+    time_stages(items[0], detector)  # warm-up: lazy imports, first cascade use
+    for _ in range(repeat):
+        for item in items:
+            times = time_stages(item, detector)
+            for stage, ms in times.items():
+                samples[stage].append(ms)
+            totals.append(sum(ms for stage, ms in times.items() if stage != "extract_skin"))
+
+    stages = {
+        stage: {"n": len(v), "p50_ms": percentile(v, 50), "p95_ms": percentile(v, 95)}
+        for stage, v in samples.items()
+    }
+    return {
+        "stages": stages,
+        "pipeline_p50_ms": percentile(totals, 50),
+        "pipeline_p95_ms": percentile(totals, 95),
+        "images_per_s_per_core": 1000 * len(totals) / sum(totals),
+        **measure_rss(items),
+    }, detector
+
+
+def measure_rss(items):
+    """Peak RSS of analysing ``items`` in a fresh process, and its rise over warm-up."""
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_corpus(items, directory)
+        proc = subprocess.run([sys.executable, "-c", _RSS_CHILD, paths[0], *paths],
+                              cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"memory measurement failed:\n{proc.stderr[-2000:]}")
+    rss = json.loads(proc.stdout.strip().splitlines()[-1])
+    return {"peak_rss_mb": rss["peak_rss_mb"], "rss_growth_mb": rss["peak_rss_mb"] - rss["warm_rss_mb"]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the analysis pipeline stage by stage.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--quick", action="store_true", help="skip 12 MP images and use 2 repeats")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true", help="store current classifications as the baseline")
+    parser.add_argument("--min-agreement", type=float, default=1.0,
+                        help="fail when the fraction of images matching the baseline is below this")
+    parser.add_argument("--json", action="store_true", help="print the raw report as JSON")
+    args = parser.parse_args(argv)
+
+    resolutions = {k: v for k, v in RESOLUTIONS.items() if not (args.quick and k == "12mp")}
+    items = build_corpus(resolutions=resolutions)
+    report, detector = run(items, repeat=2 if args.quick else args.repeat)
+
+    results = classify_corpus(items, detector)
+    if args.update_baseline:
+        if args.quick:
+            # Keep entries for images the quick run skipped.
+            results = {**_load(args.baseline), **results}
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write("\n")
+    agreement, mismatches = compare_to_baseline(results, _load(args.baseline))
+    report["agreement"] = agreement
+    report["mismatches"] = mismatches
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{len(items)} images, {report['stages']['load_image']['n']} timed runs per stage")
+        print(f"{'stage':<16}{'p50 ms':>10}{'p95 ms':>10}")
+        for stage, row in report["stages"].items():
+            print(f"{stage:<16}{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}")
+        print(f"{'pipeline':<16}{report['pipeline_p50_ms']:>10.2f}{report['pipeline_p95_ms']:>10.2f}")
+        print(f"throughput: {report['images_per_s_per_core']:.1f} images/s per core, "
+              f"pipeline peak RSS {report['peak_rss_mb']:.0f} MB "
+              f"({report['rss_growth_mb']:+.0f} MB over warm-up)")
+        print(f"classification agreement with baseline: {agreement:.1%}")
+        for name, diff in mismatches.items():
+            print(f"  {name}: {diff['baseline']} -> {diff['current']}")
+
+    if agreement < args.min_agreement:
+        print(f"FAIL: agreement {agreement:.1%} below {args.min_agreement:.1%}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def _load(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
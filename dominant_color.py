@@ -0,0 +1,214 @@
+"""Dominant skin colour estimation.
+
+Every strategy takes an (N, 3) uint8 pixel array and returns ``(centers,
+counts)``: integer colour centres of shape (k, 3) in the input channel order and
+the number of pixels assigned to each, sorted by count so ``centers[0]`` is the
+dominant colour.
+
+``exact``       the original scikit-learn KMeans(n_clusters=3, n_init=10) on all pixels
+``kmeans``      NumPy Lloyd iterations on a subsample, warm-started from median-cut centres
+``histogram``   mode finding on a quantized 3D colour histogram
+``median_cut``  recursive median split along the widest channel
+"""
+import time
+
+import numpy as np
+
+STRATEGIES = ("exact", "kmeans", "histogram", "median_cut")
+DEFAULT_STRATEGY = "kmeans"
+
+# Pixels kept (uniformly at random) before clustering; None disables subsampling.
+PIXEL_BUDGET = 20000
+
+
+def subsample(pixels, budget=PIXEL_BUDGET, seed=42):
+    if budget is None or len(pixels) <= budget:
+        return pixels
+    rng = np.random.default_rng(seed)
+    return pixels[rng.integers(0, len(pixels), budget)]
+
+
+def _sorted(centers, counts):
+    order = np.argsort(-counts, kind="stable")
+    return np.asarray(centers)[order].astype(int), np.asarray(counts)[order].astype(int)
+
+
+def exact_kmeans(pixels, n_clusters=3):
+    from sklearn.cluster import KMeans
+
+    kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10).fit(pixels)
+    return _sorted(kmeans.cluster_centers_, np.bincount(kmeans.labels_, minlength=n_clusters))
+
+
+def median_cut(pixels, n_clusters=3):
+    boxes = [np.asarray(pixels)]
+    while len(boxes) < n_clusters:
+        # Split the box with the widest single-channel range.
+        ranges = [np.ptp(b, axis=0).max() if len(b) > 1 else -1 for b in boxes]
+        i = int(np.argmax(ranges))
+        if ranges[i] <= 0:
+            break
+        box = boxes.pop(i)
+        channel = int(np.argmax(np.ptp(box, axis=0)))
+        order = np.argsort(box[:, channel], kind="stable")
+        half = len(box) // 2
+        boxes += [box[order[:half]], box[order[half:]]]
+    centers = np.array([b.mean(axis=0) for b in boxes])
+    counts = np.array([len(b) for b in boxes])
+    return _sorted(np.rint(centers), counts)
+
+
+def fast_kmeans(pixels, n_clusters=3, budget=PIXEL_BUDGET, max_iter=30, tol=0.5):
+    # Plain Lloyd iterations in NumPy: with k=3 on a few thousand points the
+    # scikit-learn setup cost dominates the actual clustering.
+    sample = subsample(pixels, budget).astype(np.float32)
+    init, _ = median_cut(sample, n_clusters)
+    centers = init.astype(np.float32)
+    sq_norms = (sample ** 2).sum(axis=1)[:, None]
+    for _ in range(max_iter):
+        dist = sq_norms - 2 * sample @ centers.T + (centers ** 2).sum(axis=1)
+        labels = np.argmin(dist, axis=1)
+        counts = np.bincount(labels, minlength=len(centers))
+        sums = np.stack([np.bincount(labels, weights=sample[:, c], minlength=len(centers)) for c in range(3)], axis=1)
+        # Empty clusters keep their previous centre.
+        new = np.where(counts[:, None] > 0, sums / np.maximum(counts, 1)[:, None], centers).astype(np.float32)
+        shift = np.abs(new - centers).max()
+        centers = new
+        if shift < tol:
+            break
+    dist = sq_norms - 2 * sample @ centers.T + (centers ** 2).sum(axis=1)
+    counts = np.bincount(np.argmin(dist, axis=1), minlength=len(centers))
+    return _sorted(np.rint(centers), counts)
+
+
+def color_histogram(pixels, bits=4, weights=None, groups=None, n_groups=None):
+    """Quantized 3D histogram of (N, 3) uint8 pixels.
+
+    Returns ``(counts, sums)`` of shapes (b, b, b) and (b, b, b, 3) with
+    ``b = 2 ** bits``; ``sums`` holds the per-bin colour totals so bin means can
+    be recovered exactly. Optional per-pixel ``weights`` scale both. With
+    ``groups`` (an integer label per pixel), one histogram per group is built in
+    the same pass and the shapes gain a leading ``n_groups`` axis.
+    """
+    pixels = np.asarray(pixels)
+    bins = 1 << bits
+    shift = 8 - bits
+    q = (pixels >> shift).astype(np.intp)
+    idx = (q[:, 0] * bins + q[:, 1]) * bins + q[:, 2]
+    size = bins ** 3
+    shape = (bins, bins, bins)
+    if groups is not None:
+        n_groups = int(n_groups if n_groups is not None else np.max(groups, initial=-1) + 1)
+        idx = idx + np.asarray(groups, dtype=np.intp) * size
+        size *= n_groups
+        shape = (n_groups,) + shape
+    counts = np.bincount(idx, weights=weights, minlength=size).reshape(shape).astype(np.float64)
+    sums = np.stack([
+        np.bincount(idx, weights=pixels[:, c] if weights is None else pixels[:, c] * weights,
+                    minlength=size).reshape(shape)
+        for c in range(3)
+    ], axis=-1)
+    return counts, sums
+
+
+def histogram_modes(pixels, n_clusters=3, bits=4):
+    return modes_from_histogram(*color_histogram(pixels, bits), n_clusters)
+
+
+def _smooth(counts, sums):
+    # 3x3x3 box sums over the last three colour axes, so that a mode straddling
+    # a bin edge is not split in two. Leading axes are batch axes.
+    bins = counts.shape[-1]
+    lead = counts.ndim - 3
+    padded_counts = np.pad(counts, ((0, 0),) * lead + ((1, 1),) * 3)
+    padded_sums = np.pad(sums, ((0, 0),) * lead + ((1, 1),) * 3 + ((0, 0),))
+    smooth_counts = np.zeros_like(counts)
+    smooth_sums = np.zeros_like(sums)
+    for dx in range(3):
+        for dy in range(3):
+            for dz in range(3):
+                window = (Ellipsis, slice(dx, dx + bins), slice(dy, dy + bins), slice(dz, dz + bins))
+                smooth_counts += padded_counts[window]
+                smooth_sums += padded_sums[window + (slice(None),)]
+    return smooth_counts, smooth_sums
+
+
+def _peaks(smooth_counts, smooth_sums, n_clusters):
+    centers, weights = [], []
+    density = smooth_counts.copy()
+    for _ in range(n_clusters):
+        flat = int(np.argmax(density))
+        if density.flat[flat] <= 0:
+            break
+        x, y, z = np.unravel_index(flat, density.shape)
+        centers.append(smooth_sums[x, y, z] / smooth_counts[x, y, z])
+        weights.append(smooth_counts[x, y, z])
+        # Suppress the neighbourhood of this peak before looking for the next.
+        density[max(0, x - 1):x + 2, max(0, y - 1):y + 2, max(0, z - 1):z + 2] = 0
+    return _sorted(np.rint(centers), np.array(weights))
+
+
+def modes_from_histogram(counts, sums, n_clusters=3):
+    return _peaks(*_smooth(counts, sums), n_clusters)
+
+
+def batched_modes(counts, sums, n_clusters=3):
+    """``modes_from_histogram`` for a stack of histograms from ``color_histogram(groups=...)``.
+
+    Smoothing runs once over the whole stack; returns a list of ``(centers,
+    counts)``, one per group (empty arrays for groups without pixels).
+    """
+    smooth_counts, smooth_sums = _smooth(counts, sums)
+    return [_peaks(c, s, n_clusters) for c, s in zip(smooth_counts, smooth_sums)]
+
+
+def dominant_colors(pixels, strategy=DEFAULT_STRATEGY, n_clusters=3, budget=PIXEL_BUDGET):
+    pixels = np.asarray(pixels, dtype=np.uint8).reshape(-1, 3)
+    if strategy == "exact":
+        return exact_kmeans(pixels, n_clusters)
+    if strategy == "kmeans":
+        return fast_kmeans(pixels, n_clusters, budget)
+    if strategy == "histogram":
+        return histogram_modes(pixels, n_clusters)
+    if strategy == "median_cut":
+        return median_cut(subsample(pixels, budget), n_clusters)
+    raise ValueError(f"Unknown dominant colour strategy {strategy!r}; expected one of {STRATEGIES}")
+
+
+def compare_strategies(pixels, strategies=STRATEGIES, n_clusters=3, budget=PIXEL_BUDGET):
+    """Time each strategy and measure how far its dominant colour is from ``exact``.
+
+    Returns ``{strategy: {"dominant": [...], "distance": float, "ms": float}}`` where
+    ``distance`` is the Euclidean distance in 8-bit colour space.
+    """
+    report = {}
+    reference = None
+    for strategy in ("exact",) + tuple(s for s in strategies if s != "exact"):
+        t0 = time.perf_counter()
+        centers, _ = dominant_colors(pixels, strategy, n_clusters, budget)
+        ms = (time.perf_counter() - t0) * 1000
+        if reference is None:
+            reference = centers[0]
+        report[strategy] = {
+            "dominant": centers[0].tolist(),
+            "distance": float(np.linalg.norm(centers[0] - reference)),
+            "ms": ms,
+        }
+    return report
+
+
+if __name__ == "__main__":
+    # python dominant_color.py photo.jpg [...] -- compare strategies on real faces.
+    import sys
+
+    from analysis import detect_face, extract_skin, load_image
+
+    for path in sys.argv[1:]:
+        face = detect_face(load_image(path))
+        if face is None:
+            print(f"{path}: no face")
+            continue
+        pixels = extract_skin(face)
+        print(f"{path}: {len(pixels)} skin pixels")
+        for strategy, row in compare_strategies(pixels).items():
+            print(f"  {strategy:<11} {str(row['dominant']):<16} dist={row['distance']:6.2f}  {row['ms']:8.2f} ms")
@@ -0,0 +1,107 @@
+"""Haar cascade face detection with a reusable, per-process detector.
+
+Parsing haarcascade_frontalface_default.xml is expensive, and
+``cv2.CascadeClassifier`` must not be shared between threads running
+``detectMultiScale`` at the same time. ``FaceDetector`` keeps a small free list of
+loaded cascades: each concurrent caller borrows one and hands it back, so a
+process loads the XML once per thread that is actually detecting in parallel.
+
+OpenCV is imported on first use, so reading the detection settings below (as
+``analysis.pipeline_version`` does) does not load it.
+"""
+import queue
+import threading
+
+# Resolved against cv2.data.haarcascades when a detector is created.
+CASCADE_FILE = 'haarcascade_frontalface_default.xml'
+
+# Long side, in pixels, that images are shrunk to before running the cascade.
+# Faces that become too small for the 24x24 cascade window at this size are
+# picked up by a full-resolution retry (see ``FaceDetector.detect``).
+DETECTION_MAX_SIDE = 1024
+
+# detectMultiScale settings used by the shared detector.
+SCALE_FACTOR = 1.3
+MIN_NEIGHBORS = 5
+
+
+class FaceDetector:
+    def __init__(self, cascade_path=None, max_side=DETECTION_MAX_SIDE,
+                 scale_factor=SCALE_FACTOR, min_neighbors=MIN_NEIGHBORS, retry_full_res=True):
+        import cv2
+
+        self.cascade_path = cascade_path or cv2.data.haarcascades + CASCADE_FILE
+        self.max_side = max_side
+        self.retry_full_res = retry_full_res
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self._cascades = queue.SimpleQueue()
+        self.loads = 0
+        self._cascades.put(self._load())
+
+    def _load(self):
+        import cv2
+
+        cascade = cv2.CascadeClassifier(self.cascade_path)
+        if cascade.empty():
+            raise IOError(f"Could not load face cascade from {self.cascade_path}")
+        self.loads += 1
+        return cascade
+
+    def _acquire(self):
+        try:
+            return self._cascades.get_nowait()
+        except queue.Empty:
+            return self._load()
+
+    def _run(self, gray):
+        cascade = self._acquire()
+        try:
+            return cascade.detectMultiScale(gray, self.scale_factor, self.min_neighbors)
+        finally:
+            self._cascades.put(cascade)
+
+    def detect(self, img_bgr):
+        """Return face boxes as (x, y, w, h) in full-resolution coordinates."""
+        import cv2
+
+        full = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY) if img_bgr.ndim == 3 else img_bgr
+        h, w = full.shape[:2]
+        scale = 1.0
+        gray = full
+        if self.max_side and max(h, w) > self.max_side:
+            scale = self.max_side / max(h, w)
+            gray = cv2.resize(full, (max(1, round(w * scale)), max(1, round(h * scale))),
+                              interpolation=cv2.INTER_AREA)
+
+        faces = self._run(gray)
+        if len(faces) == 0 and scale < 1.0 and self.retry_full_res:
+            faces = self._run(full)
+            scale = 1.0
+
+        boxes = []
+        for x, y, fw, fh in faces:
+            x0, y0 = int(x / scale), int(y / scale)
+            x1, y1 = min(w, int(round((x + fw) / scale))), min(h, int(round((y + fh) / scale)))
+            boxes.append((x0, y0, x1 - x0, y1 - y0))
+        return boxes
+
+    def largest(self, img_bgr):
+        boxes = self.detect(img_bgr)
+        if not boxes:
+            return None
+        return max(boxes, key=lambda f: f[2] * f[3])
+
+
+_default_detector = None
+_default_lock = threading.Lock()
+
+
+def get_detector():
+    """Module-level detector shared by everything in this process."""
+    global _default_detector
+    if _default_detector is None:
+        with _default_lock:
+            if _default_detector is None:
+                _default_detector = FaceDetector()
+    return _default_detector
@@ -0,0 +1,200 @@
+"""Matching palettes against a garment catalogue in CIELAB.
+
+The catalogue (CSV or Parquet, one row per SKU) needs a ``sku`` column, a colour
+as ``color`` (hex) or ``r``/``g``/``b`` columns, and optionally ``gender``
+(Male/Female/Unisex, blank means Unisex) and ``occasion`` (one of the palette
+occasions, several separated by ``|``, blank means any). Other columns are kept
+and returned with the matches. Rows with a missing or malformed colour are
+skipped, and their number is logged and kept in ``skipped``.
+
+Colours are converted to CIELAB once at load time and split by (gender,
+occasion) into KD-trees, so a query touches only the partitions that can match
+and asks each tree for its nearest garments to every palette colour. Distances
+are CIE76 ΔE (Euclidean in Lab); Unisex garments match every gender and
+"any occasion" garments match every occasion.
+
+    python garment_catalogue.py garments.csv --skin-tone Tan --undertone Warm \\
+        --gender Female --occasion Party
+"""
+import argparse
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger("fashionai.catalogue")
+
+ANY_OCCASION = "Any"
+UNISEX = "Unisex"
+
+HEX_COLOR = r"#?[0-9a-fA-F]{6}"
+
+# CIE76 ΔE beyond which a garment is not considered a match for a palette colour.
+# Around 2 is a just-noticeable difference; 12 keeps garments that read as the
+# same colour family.
+MAX_DELTA_E = 12.0
+
+# sRGB (D65) -> XYZ, and the D65 reference white.
+_RGB_TO_XYZ = np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.0721750],
+    [0.0193339, 0.1191920, 0.9503041],
+])
+_WHITE = np.array([0.95047, 1.0, 1.08883])
+
+
+def rgb_to_lab(rgb):
+    """CIELAB (D65) for an array of 8-bit sRGB colours of shape (..., 3)."""
+    c = np.asarray(rgb, dtype=np.float64) / 255.0
+    linear = np.where(c <= 0.04045, c / 12.92, ((c + 0.055) / 1.055) ** 2.4)
+    t = (linear @ _RGB_TO_XYZ.T) / _WHITE
+    eps, kappa = 216 / 24389, 24389 / 27
+    f = np.where(t > eps, np.cbrt(t), (kappa * t + 16) / 116)
+    fx, fy, fz = f[..., 0], f[..., 1], f[..., 2]
+    return np.stack([116 * fy - 16, 500 * (fx - fy), 200 * (fy - fz)], axis=-1)
+
+
+_HEX_DIGITS = np.zeros(256, dtype=np.uint8)
+_HEX_DIGITS[np.frombuffer(b"0123456789abcdef", dtype=np.uint8)] = np.arange(16)
+_HEX_DIGITS[np.frombuffer(b"ABCDEF", dtype=np.uint8)] = np.arange(10, 16)
+
+
+def hex_to_rgb_array(hex_colors):
+    """(N, 3) uint8 array from "#rrggbb" strings, parsed without a Python loop per colour.
+
+    Strings are not checked; see ``valid_colors``.
+    """
+    digits = np.char.lstrip(np.asarray(hex_colors, dtype="S7"), b"#").astype("S6")
+    nibbles = _HEX_DIGITS[digits.view(np.uint8).reshape(-1, 6)]
+    return (nibbles[:, 0::2] << 4) | nibbles[:, 1::2]
+
+
+def valid_colors(frame):
+    """Boolean mask of the rows whose colour is a 6-digit hex or r/g/b values in 0-255."""
+    import pandas as pd
+
+    if "color" in frame:
+        return frame["color"].astype(str).str.fullmatch(HEX_COLOR).fillna(False).astype(bool)
+    channels = frame[["r", "g", "b"]].apply(pd.to_numeric, errors="coerce")
+    return ((channels >= 0) & (channels <= 255) & (channels == channels.round())).all(axis=1)
+
+
+def read_catalogue(path):
+    import pandas as pd
+
+    if path.endswith((".parquet", ".pq")):
+        return pd.read_parquet(path)
+    return pd.read_csv(path, dtype={"sku": str})
+
+
+class GarmentCatalogue:
+    def __init__(self, frame):
+        from sklearn.neighbors import KDTree
+
+        if "sku" not in frame:
+            raise ValueError("catalogue needs a 'sku' column")
+        if "color" not in frame and not {"r", "g", "b"} <= set(frame.columns):
+            raise ValueError("catalogue needs a 'color' hex column or r/g/b columns")
+        # Blank or malformed colours would otherwise parse as real ones.
+        valid = valid_colors(frame)
+        self.skipped = int((~valid).sum())
+        if self.skipped:
+            logger.warning("skipped %d of %d catalogue rows with a missing or invalid colour", self.skipped, len(frame))
+        frame = frame[valid].reset_index(drop=True)
+        if "color" in frame:
+            rgb = hex_to_rgb_array(frame["color"].astype(str))
+        else:
+            rgb = frame[["r", "g", "b"]].astype(float).to_numpy(dtype=np.uint8)
+            frame["color"] = ["#%02x%02x%02x" % tuple(c) for c in rgb]
+        self.frame = frame
+        self.lab = rgb_to_lab(rgb)
+
+        import pandas as pd
+
+        genders = frame["gender"] if "gender" in frame else pd.Series(UNISEX, index=frame.index)
+        occasions = frame["occasion"] if "occasion" in frame else pd.Series("", index=frame.index)
+        keys = pd.DataFrame({
+            "gender": genders.fillna("").astype(str).str.strip().replace("", UNISEX),
+            # One row per (garment, occasion) for garments listing several.
+            "occasion": occasions.fillna("").astype(str).str.split("|"),
+        }).explode("occasion")
+        keys["occasion"] = keys["occasion"].str.strip().replace("", ANY_OCCASION)
+        keys = keys.reset_index().drop_duplicates()
+        self.partitions = {}
+        for key, group in keys.groupby(["gender", "occasion"]):
+            rows = group["index"].to_numpy(dtype=np.intp)
+            self.partitions[key] = (KDTree(self.lab[rows]), rows)
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(read_catalogue(path))
+
+    def __len__(self):
+        return len(self.frame)
+
+    def _keys(self, gender, occasion):
+        genders = {gender, UNISEX}
+        occasions = {occasion, ANY_OCCASION}
+        return [(g, o) for g in genders for o in occasions if (g, o) in self.partitions]
+
+    def match(self, palette, gender, occasion, k=10, max_delta_e=MAX_DELTA_E):
+        """Up to ``k`` garments closest to any colour of ``palette`` (hex strings).
+
+        Returns a list of dicts (catalogue columns plus ``delta_e`` and the
+        ``palette_color`` matched), nearest first; garments further than
+        ``max_delta_e`` from every palette colour are left out.
+        """
+        if not palette:
+            return []
+        targets = rgb_to_lab(hex_to_rgb_array(palette))
+        best = {}
+        for key in self._keys(gender, occasion):
+            tree, rows = self.partitions[key]
+            dist, idx = tree.query(targets, k=min(k, len(rows)))
+            for color, (d_row, i_row) in enumerate(zip(dist, idx)):
+                for d, i in zip(d_row, i_row):
+                    if d > max_delta_e:
+                        break
+                    row = int(rows[i])
+                    if row not in best or d < best[row][0]:
+                        best[row] = (float(d), color)
+        ranked = sorted(best.items(), key=lambda item: item[1][0])[:k]
+        rows = self.frame.iloc[[row for row, _ in ranked]]
+        # Blank cells come back as None rather than NaN so records serialise as JSON.
+        records = rows.astype(object).where(rows.notna(), None).to_dict("records")
+        for record, (_, (d, color)) in zip(records, ranked):
+            record["delta_e"] = round(d, 2)
+            record["palette_color"] = palette[color]
+        return records
+
+
+def load_from_env(var="FASHIONAI_CATALOGUE"):
+    """Catalogue from the path in ``$FASHIONAI_CATALOGUE``, or None when unset."""
+    path = os.environ.get(var)
+    return GarmentCatalogue.from_file(path) if path else None
+
+
+def main(argv=None):
+    from analysis import PaletteModel, suggest_colors
+
+    parser = argparse.ArgumentParser(description="Find catalogue garments matching a profile's palette.")
+    parser.add_argument("catalogue", help="CSV or Parquet file")
+    parser.add_argument("--skin-tone", default="Medium")
+    parser.add_argument("--undertone", default="Neutral")
+    parser.add_argument("--gender", default=UNISEX)
+    parser.add_argument("--occasion", default="Daily")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--max-delta-e", type=float, default=MAX_DELTA_E)
+    args = parser.parse_args(argv)
+
+    catalogue = GarmentCatalogue.from_file(args.catalogue)
+    if catalogue.skipped:
+        print(f"skipped {catalogue.skipped} rows with a missing or invalid colour")
+    palette = suggest_colors(args.skin_tone, args.undertone, args.gender, args.occasion, PaletteModel())
+    print("palette:", " ".join(palette))
+    for match in catalogue.match(palette, args.gender, args.occasion, args.k, args.max_delta_e):
+        print(f"{match['sku']:<16} {match['color']}  ΔE {match['delta_e']:5.2f}  ~ {match['palette_color']}")
+
+
+if __name__ == "__main__":
+    main()
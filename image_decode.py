@@ -0,0 +1,138 @@
+"""Upload decoding straight to a BGR array at the resolution the pipeline needs.
+
+The encoded bytes are read once and handed to ``cv2.imdecode`` without a copy.
+JPEGs, which is what phones upload (including the MPO variant many phones
+write), are decoded with libjpeg's DCT scaling (``IMREAD_REDUCED_COLOR_2/4/8``)
+to the smallest size whose long side is still at least ``max_side``, so a 12 MP
+photo never exists as a full-size array. OpenCV applies EXIF orientation to
+JPEGs itself; for other formats it is read from the header and applied here.
+Grayscale, palette and 16-bit inputs are converted to 8-bit BGR, and
+transparent pixels are composited onto white so they do not read as black
+skin. Formats OpenCV cannot read go through PIL.
+"""
+import io
+import os
+
+import numpy as np
+
+# Long side, in pixels, that uploads are decoded to for analysis. Matches the
+# face detector's working resolution; reduced JPEG decoding never goes below it.
+DECODE_MAX_SIDE = 1024
+
+_REDUCED_FLAGS = {2: "IMREAD_REDUCED_COLOR_2", 4: "IMREAD_REDUCED_COLOR_4", 8: "IMREAD_REDUCED_COLOR_8"}
+
+# PIL formats decoded as JPEG; MPO is a JPEG with extra frames after the first.
+JPEG_FORMATS = ("JPEG", "MPO")
+
+_ORIENTATION_TAG = 0x0112
+
+
+def read_bytes(image_file):
+    """Encoded bytes from a path, bytes-like object or file-like object."""
+    if isinstance(image_file, (str, os.PathLike)):
+        with open(image_file, "rb") as f:
+            return f.read()
+    if isinstance(image_file, (bytes, bytearray, memoryview)):
+        return image_file
+    if hasattr(image_file, "getvalue"):
+        return image_file.getvalue()
+    return image_file.read()
+
+
+def _header(data):
+    """(format, (width, height), EXIF orientation) from the header, without decoding pixels."""
+    from PIL import Image
+
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            # img.getexif() would decode a whole PNG to look for a late eXIf chunk.
+            exif = img.info.get("exif")
+            orientation = Image.Exif()
+            if exif:
+                orientation.load(exif)
+            return img.format, img.size, orientation.get(_ORIENTATION_TAG, 1)
+    except Exception:
+        return None, None, 1
+
+
+def reduction_factor(size, max_side):
+    if not max_side or size is None:
+        return 1
+    long_side = max(size)
+    factor = 1
+    while factor < 8 and long_side / (factor * 2) >= max_side:
+        factor *= 2
+    return factor
+
+
+def _to_bgr(img):
+    import cv2
+
+    if img.dtype == np.uint16:
+        img = (img >> 8).astype(np.uint8)
+    if img.ndim == 2:
+        return cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+    if img.shape[2] == 4:
+        bgr = img[..., :3].astype(np.float32)
+        alpha = img[..., 3:].astype(np.float32) / 255.0
+        return (bgr * alpha + 255.0 * (1.0 - alpha)).astype(np.uint8)
+    return img
+
+
+def _apply_orientation(img, orientation):
+    """Turn a decoded array upright according to its EXIF orientation (1-8)."""
+    import cv2
+
+    if orientation == 2:
+        return cv2.flip(img, 1)
+    if orientation == 3:
+        return cv2.rotate(img, cv2.ROTATE_180)
+    if orientation == 4:
+        return cv2.flip(img, 0)
+    if orientation == 5:
+        return cv2.transpose(img)
+    if orientation == 6:
+        return cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE)
+    if orientation == 7:
+        return cv2.rotate(cv2.transpose(img), cv2.ROTATE_180)
+    if orientation == 8:
+        return cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    return img
+
+
+def _decode_pil(data, max_side):
+    from PIL import Image, ImageOps
+
+    img = Image.open(io.BytesIO(data))
+    if max_side:
+        img.draft("RGB", (max_side, max_side))
+    img = ImageOps.exif_transpose(img)
+    if img.mode in ("RGBA", "LA", "P"):
+        img = img.convert("RGBA")
+        background = Image.new("RGBA", img.size, (255, 255, 255, 255))
+        img = Image.alpha_composite(background, img)
+    rgb = np.asarray(img.convert("RGB"))
+    return np.ascontiguousarray(rgb[..., ::-1])
+
+
+def decode_image(data, max_side=None):
+    """Decode encoded image bytes to a BGR uint8 array.
+
+    With ``max_side``, JPEGs are decoded at 1/2, 1/4 or 1/8 scale as long as the
+    long side stays >= ``max_side``; other formats are decoded at full size.
+    """
+    import cv2
+
+    buf = np.frombuffer(data, dtype=np.uint8)
+    fmt, size, orientation = _header(data)
+    if fmt in JPEG_FORMATS:
+        factor = reduction_factor(size, max_side)
+        flag = getattr(cv2, _REDUCED_FLAGS[factor]) if factor > 1 else cv2.IMREAD_COLOR
+        img = cv2.imdecode(buf, flag)
+    else:
+        img = cv2.imdecode(buf, cv2.IMREAD_UNCHANGED)
+        if img is not None:
+            img = _apply_orientation(_to_bgr(img), orientation)
+    if img is None:
+        img = _decode_pil(data, max_side)
+    return img
@@ -0,0 +1,223 @@
+"""Continuous skin tone analysis on a webcam or video file.
+
+Running the Haar cascade and clustering on every frame cannot keep up with
+video, so ``LiveAnalyzer`` splits the work:
+
+* the cascade runs only every ``detect_every`` frames, or as soon as tracking
+  is lost;
+* in between, the face box is tracked by template matching in a small search
+  window on a downscaled grayscale frame;
+* each frame adds its region-weighted skin histogram to an exponential moving
+  average, and the dominant colour is the mode of that running histogram;
+* tone and undertone are reported as ``stable`` once the dominant colour has
+  stayed within ``tolerance`` for ``converge_frames`` frames that added skin
+  pixels, and only while a face is in view;
+* after ``forget_after`` frames without a face the running histogram is
+  dropped, so the next person starts from their own frames.
+
+    python live.py                  # default webcam
+    python live.py --source clip.mp4 --detect-every 10
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from analysis import classify_skin, estimate_undertone, rgb_to_hex
+from dominant_color import modes_from_histogram
+from skin_sampling import skin_histogram
+
+# Width the face template is scaled to for tracking.
+TEMPLATE_WIDTH = 48
+# Below this normalised correlation the track is considered lost.
+MIN_TRACK_SCORE = 0.55
+
+
+class TemplateTracker:
+    def __init__(self, search_margin=0.5):
+        self.search_margin = search_margin
+        self.template = None
+        self.box = None
+        self.scale = 1.0
+
+    def _gray(self, frame):
+        import cv2
+
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+
+    def init(self, frame, box):
+        import cv2
+
+        x, y, w, h = box
+        self.scale = TEMPLATE_WIDTH / w
+        face = self._gray(frame[y:y + h, x:x + w])
+        self.template = cv2.resize(face, (TEMPLATE_WIDTH, max(1, round(h * self.scale))),
+                                   interpolation=cv2.INTER_AREA)
+        self.box = box
+
+    def update(self, frame):
+        """New box for ``frame``, or None when the face is lost."""
+        import cv2
+
+        if self.template is None:
+            return None
+        x, y, w, h = self.box
+        H, W = frame.shape[:2]
+        mx, my = int(w * self.search_margin), int(h * self.search_margin)
+        sx0, sy0 = max(0, x - mx), max(0, y - my)
+        sx1, sy1 = min(W, x + w + mx), min(H, y + h + my)
+        window = self._gray(frame[sy0:sy1, sx0:sx1])
+        size = (max(1, round((sx1 - sx0) * self.scale)), max(1, round((sy1 - sy0) * self.scale)))
+        window = cv2.resize(window, size, interpolation=cv2.INTER_AREA)
+        th, tw = self.template.shape
+        if window.shape[0] < th or window.shape[1] < tw:
+            return None
+        scores = cv2.matchTemplate(window, self.template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (px, py) = cv2.minMaxLoc(scores)
+        if score < MIN_TRACK_SCORE:
+            return None
+        self.box = (sx0 + int(px / self.scale), sy0 + int(py / self.scale), w, h)
+        return self.box
+
+
+class LiveAnalyzer:
+    def __init__(self, detector=None, detect_every=15, ema=0.15, bits=4,
+                 converge_frames=20, tolerance=4.0, forget_after=30):
+        if detector is None:
+            from face_detector import FaceDetector
+            detector = FaceDetector(max_side=480)
+        self.detector = detector
+        self.detect_every = detect_every
+        self.ema = ema
+        self.bits = bits
+        self.converge_frames = converge_frames
+        self.tolerance = tolerance
+        self.forget_after = forget_after
+        self.tracker = TemplateTracker()
+        self.reset()
+
+    def reset(self):
+        self.frame_index = 0
+        self.box = None
+        self.detections = 0
+        self.forget()
+
+    def forget(self):
+        """Drop the running skin histogram, e.g. when the person leaves."""
+        self.counts = None
+        self.sums = None
+        self.dominant = None
+        self.steady_frames = 0
+        self.frames_without_face = 0
+
+    def _locate(self, frame):
+        due = self.box is None or self.frame_index % self.detect_every == 0
+        if not due:
+            self.box = self.tracker.update(frame)
+        if due or self.box is None:
+            self.detections += 1
+            self.box = self.detector.largest(frame)
+            if self.box is not None:
+                self.tracker.init(frame, self.box)
+        return self.box
+
+    def _accumulate(self, frame, box):
+        """Add the skin histogram under ``box``; returns False when it had no skin pixels."""
+        counts, sums = skin_histogram(frame, box, self.bits)
+        if counts.sum() == 0:
+            return False
+        if self.counts is None:
+            self.counts, self.sums = counts, sums
+        else:
+            a = self.ema
+            self.counts = (1 - a) * self.counts + a * counts
+            self.sums = (1 - a) * self.sums + a * sums
+        return True
+
+    def update(self, frame):
+        """Process one BGR frame; returns the current state as a dict."""
+        box = self._locate(frame)
+        self.frame_index += 1
+        if box is None:
+            self.frames_without_face += 1
+            if self.frames_without_face >= self.forget_after:
+                self.forget()
+            added = False
+        else:
+            self.frames_without_face = 0
+            added = self._accumulate(frame, box)
+
+        # Convergence only counts frames that contributed skin pixels.
+        if added:
+            centers, _ = modes_from_histogram(self.counts, self.sums, n_clusters=1)
+            dominant = centers[0]
+            if self.dominant is not None and np.abs(dominant - self.dominant).max() <= self.tolerance:
+                self.steady_frames += 1
+            else:
+                self.steady_frames = 0
+            self.dominant = dominant
+
+        state = {"frame": self.frame_index, "face_box": None if box is None else [int(v) for v in box], "stable": False}
+        if self.dominant is not None:
+            state.update({
+                "dominant_hex": rgb_to_hex(self.dominant[::-1]),
+                "skin_tone": classify_skin(self.dominant),
+                "undertone": estimate_undertone(self.dominant),
+                "stable": box is not None and self.steady_frames >= self.converge_frames,
+            })
+        return state
+
+
+def open_source(source):
+    """``cv2.VideoCapture`` for a webcam index or a video file path."""
+    import cv2
+
+    capture = cv2.VideoCapture(int(source) if str(source).isdigit() else source)
+    if not capture.isOpened():
+        raise IOError(f"Could not open video source {source!r}")
+    return capture
+
+
+def frames(capture):
+    try:
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                return
+            yield frame
+    finally:
+        capture.release()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Live skin tone analysis from a webcam or video file.")
+    parser.add_argument("--source", default="0", help="webcam index or video file path")
+    parser.add_argument("--detect-every", type=int, default=15, help="run the face cascade every N frames")
+    parser.add_argument("--max-frames", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    try:
+        capture = open_source(args.source)
+    except IOError as e:
+        parser.error(str(e))
+
+    analyzer = LiveAnalyzer(detect_every=args.detect_every)
+    last_report = None
+    t0 = time.perf_counter()
+    for i, frame in enumerate(frames(capture)):
+        if args.max_frames is not None and i >= args.max_frames:
+            break
+        state = analyzer.update(frame)
+        report = (state.get("skin_tone"), state.get("undertone"), state["stable"])
+        if report != last_report and state["stable"]:
+            print(f"frame {state['frame']}: {state['skin_tone']} / {state['undertone']} ({state['dominant_hex']})")
+        last_report = report
+    elapsed = time.perf_counter() - t0
+    if analyzer.frame_index:
+        print(f"{analyzer.frame_index} frames, {analyzer.detections} detections, "
+              f"{analyzer.frame_index / elapsed:.1f} fps", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""Per-stage timings and counters for the analysis pipeline.
+
+``REGISTRY`` is a process-wide store of counters and latency histograms that
+renders in the Prometheus text exposition format. It can be scraped over HTTP
+(``start_http_server``) or written to a file for a textfile collector
+(``write_textfile``). A ``Trace`` collects the stages and counters of a single
+request, feeds them into the registry, and emits one structured JSON log line
+through the ``fashionai.metrics`` logger.
+
+Configured from the environment by ``configure_from_env``:
+
+    FASHIONAI_METRICS_PORT   serve /metrics on this port
+    FASHIONAI_METRICS_FILE   rewrite this file after every request
+    FASHIONAI_LOG_LEVEL      level for the JSON request log (e.g. INFO)
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+logger = logging.getLogger("fashionai.metrics")
+
+PREFIX = "fashionai_"
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+class Registry:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._histograms = {}
+        self._help = {}
+
+    def describe(self, name, text):
+        self._help[PREFIX + name] = text
+
+    def inc(self, name, value=1, **labels):
+        with self._lock:
+            self._counters[(PREFIX + name, _labels(labels))] += value
+
+    def observe(self, name, seconds, **labels):
+        key = (PREFIX + name, _labels(labels))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    hist[0][i] += 1
+            hist[1] += seconds
+            hist[2] += 1
+
+    def value(self, name, **labels):
+        return self._counters.get((PREFIX + name, _labels(labels)), 0.0)
+
+    def render(self):
+        """Prometheus text exposition format."""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {k: (list(v[0]), v[1], v[2]) for k, v in self._histograms.items()}
+        lines = []
+        seen = set()
+
+        def header(name, kind):
+            if name not in seen:
+                seen.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in sorted(counters.items()):
+            header(name, "counter")
+            lines.append(f"{name}{_format_labels(labels)} {value:g}")
+        for (name, labels), (buckets, total, count) in sorted(histograms.items()):
+            header(name, "histogram")
+            for bound, n in zip(self.buckets, buckets):
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', f'{bound:g}')])} {n}")
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total:g}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+REGISTRY = Registry()
+REGISTRY.describe("stage_seconds", "Time spent in each pipeline stage.")
+REGISTRY.describe("faces_found_total", "Faces returned by the detector.")
+REGISTRY.describe("skin_pixels_total", "Skin pixels sampled for dominant color estimation.")
+REGISTRY.describe("analysis_cache_total", "Analysis cache lookups by result.")
+REGISTRY.describe("palette_fallback_total", "Palette lookups that fell back to the default palette.")
+REGISTRY.describe("requests_total", "Requests traced, by kind.")
+REGISTRY.describe("analysis_pool_jobs_total", "Analysis pool submissions by outcome.")
+
+
+class Trace:
+    """Stages and counters of one request."""
+
+    def __init__(self, kind="request", registry=REGISTRY):
+        self.kind = kind
+        self.registry = registry
+        self.timings = {}
+        self.counters = defaultdict(int)
+
+    @contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - t0
+            self.timings[name] = self.timings.get(name, 0.0) + elapsed * 1000
+            self.registry.observe("stage_seconds", elapsed, stage=name)
+
+    def merge(self, timings_ms):
+        """Fold in stage timings measured elsewhere, e.g. in a worker process."""
+        for name, ms in timings_ms.items():
+            self.timings[name] = self.timings.get(name, 0.0) + ms
+            self.registry.observe("stage_seconds", ms / 1000, stage=name)
+
+    def merge_counts(self, counters):
+        """Fold in counters recorded elsewhere; the counterpart of ``merge``."""
+        for name, value in counters.items():
+            self.count(name, value)
+
+    def count(self, name, value=1):
+        """Add to a per-request counter; the registry keeps ``<name>_total``."""
+        self.counters[name] += value
+        self.registry.inc(name + "_total", value)
+
+    def note(self, name, value):
+        """Record a per-request value that has no process-wide counterpart."""
+        self.counters[name] = value
+
+    def emit(self, **fields):
+        self.registry.inc("requests_total", kind=self.kind)
+        if logger.isEnabledFor(logging.INFO):
+            record = {"event": self.kind, "timings_ms": {k: round(v, 3) for k, v in self.timings.items()},
+                      "counters": dict(self.counters), **fields}
+            logger.info(json.dumps(record, default=str))
+        if _textfile_path:
+            write_textfile(_textfile_path, self.registry)
+
+
+def write_textfile(path, registry=REGISTRY):
+    # Write then rename so a scraper never reads a half-written file.
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(registry.render())
+    os.replace(tmp, path)
+
+
+def start_http_server(port, addr="0.0.0.0", registry=REGISTRY):
+    """Serve ``GET /metrics`` from a daemon thread; returns the server."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((addr, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+_textfile_path = None
+
+
+def configure_from_env(environ=os.environ):
+    global _textfile_path
+    level = environ.get("FASHIONAI_LOG_LEVEL")
+    if level:
+        logger.setLevel(level.upper())
+        if not logger.handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+    _textfile_path = environ.get("FASHIONAI_METRICS_FILE") or None
+    port = environ.get("FASHIONAI_METRICS_PORT")
+    if port:
+        return start_http_server(int(port))
+    return None
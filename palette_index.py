@@ -0,0 +1,123 @@
+"""Array-backed palette lookup.
+
+``category_palettes`` is compiled once into a dense uint8 array indexed by
+integer codes for (SkinToneCategory, UndertoneType, Gender, Suggested_For), so a
+lookup is an array index and a batch of lookups is a single gather. Profiles
+that are not in ``category_palettes`` (including unknown category strings) get
+``DEFAULT_PALETTE`` and are counted in ``fallback_hits`` / ``fallback_keys``.
+"""
+import threading
+from collections import Counter
+
+import numpy as np
+
+from category_palettes import category_palettes
+from metrics import REGISTRY
+
+SKIN_TONES = ["Fair", "Medium", "Olive", "Tan", "Dark", "Very Dark"]
+UNDERTONES = ["Cool", "Warm", "Neutral"]
+GENDERS = ["Male", "Female", "Unisex"]
+OCCASIONS = ["Casual", "Formal", "Party", "Festive", "Daily"]
+
+COLUMNS = ["SkinToneCategory", "UndertoneType", "Gender", "Suggested_For"]
+VOCABULARIES = dict(zip(COLUMNS, [SKIN_TONES, UNDERTONES, GENDERS, OCCASIONS]))
+
+DEFAULT_PALETTE = [[102, 205, 170], [255, 105, 180], [75, 0, 130], [255, 165, 0], [70, 130, 180]]
+
+
+class PaletteIndex:
+    def __init__(self, palettes=category_palettes, default=DEFAULT_PALETTE):
+        self.vocabularies = [list(VOCABULARIES[c]) for c in COLUMNS]
+        self._codes = [{v: i for i, v in enumerate(vocab)} for vocab in self.vocabularies]
+        self.default = np.asarray(default, dtype=np.uint8)
+        shape = tuple(len(v) for v in self.vocabularies)
+
+        self.table = np.empty(shape + (5, 3), dtype=np.uint8)
+        self.table[...] = self.default
+        self.is_default = np.ones(shape, dtype=bool)
+        for key, palette in palettes.items():
+            codes = self.encode_key(key)
+            if min(codes) < 0:
+                raise ValueError(f"Palette key {key!r} uses a category outside {COLUMNS} vocabularies")
+            self.table[codes] = np.asarray(palette, dtype=np.uint8)
+            self.is_default[codes] = False
+
+        # A trailing row along every axis holds the default palette so that
+        # code -1 (unknown category) gathers the fallback without branching.
+        inner = (slice(0, -1),) * 4
+        self._padded = np.empty(tuple(n + 1 for n in shape) + (5, 3), dtype=np.uint8)
+        self._padded[...] = self.default
+        self._padded[inner] = self.table
+        self._padded_is_default = np.ones(tuple(n + 1 for n in shape), dtype=bool)
+        self._padded_is_default[inner] = self.is_default
+
+        self._lock = threading.Lock()
+        self.fallback_hits = 0
+        self.fallback_keys = Counter()
+
+    def encode_key(self, key):
+        return tuple(codes.get(v, -1) for codes, v in zip(self._codes, key))
+
+    def encode(self, column, values):
+        """Map an array of category strings for ``column`` to int codes (-1 when unknown)."""
+        import pandas as pd
+
+        vocab = self.vocabularies[COLUMNS.index(column)]
+        values = np.asarray(values, dtype=object)
+        codes = pd.Categorical(values.ravel(), categories=vocab).codes
+        return codes.astype(np.intp).reshape(values.shape)
+
+    def _record_fallbacks(self, keys):
+        with self._lock:
+            self.fallback_hits += len(keys)
+            self.fallback_keys.update(keys)
+        REGISTRY.inc("palette_fallback_total", len(keys))
+
+    def record_fallback(self, skin_tone, undertone, gender, outfit):
+        """Count a fallback served for this profile by something other than this index."""
+        self._record_fallbacks([(skin_tone, undertone, gender, outfit)])
+
+    def has_palette(self, skin_tone, undertone, gender, outfit):
+        return not self._padded_is_default[self.encode_key((skin_tone, undertone, gender, outfit))]
+
+    def lookup(self, skin_tone, undertone, gender, outfit):
+        """Palette for one profile as a (5, 3) uint8 array."""
+        codes = self.encode_key((skin_tone, undertone, gender, outfit))
+        if self._padded_is_default[codes]:
+            self._record_fallbacks([(skin_tone, undertone, gender, outfit)])
+        return self._padded[codes]
+
+    def predict_batch(self, tones, undertones, genders, occasions):
+        """Gather palettes for arrays of integer codes.
+
+        Returns ``(palettes, fallback)``: a (n, 5, 3) uint8 array and a boolean
+        mask of rows that received the default palette.
+        """
+        shape = self._padded_is_default.shape
+        codes = np.broadcast_arrays(*(np.asarray(c, dtype=np.intp) for c in (tones, undertones, genders, occasions)))
+        # Unknown (-1) codes point at the trailing default row of each axis.
+        flat = np.ravel_multi_index(tuple(np.where(c < 0, n - 1, c) for c, n in zip(codes, shape)), shape)
+        palettes = self._padded.reshape(-1, 5, 3)[flat]
+        fallback = self._padded_is_default.ravel()[flat]
+        if fallback.any():
+            counts = np.bincount(flat[fallback], minlength=self._padded_is_default.size)
+            hits = np.flatnonzero(counts)
+            with self._lock:
+                self.fallback_hits += int(counts[hits].sum())
+                for index, row in zip(hits, np.array(np.unravel_index(hits, shape)).T):
+                    self.fallback_keys[self.decode_key(row)] += int(counts[index])
+            REGISTRY.inc("palette_fallback_total", int(counts[hits].sum()))
+        return palettes, fallback
+
+    def decode_key(self, codes):
+        return tuple(vocab[c] if 0 <= c < len(vocab) else None for vocab, c in zip(self.vocabularies, codes))
+
+    def predict_frame(self, X):
+        """Palettes for every row of a DataFrame with the four profile columns."""
+        codes = [self.encode(c, X[c].to_numpy()) for c in COLUMNS]
+        return self.predict_batch(*codes)
+
+    def predict(self, X):
+        # Same contract as the original PaletteModel: flattened palette of the first row.
+        row = X.iloc[0]
+        return self.lookup(*(row[c] for c in COLUMNS)).flatten().astype(int)
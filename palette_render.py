@@ -0,0 +1,60 @@
+"""Palette swatch rendering straight to PNG bytes.
+
+Replaces the per-request matplotlib figure: the strip is drawn with PIL, encoded
+once, and the same bytes are used for ``st.image`` and ``st.download_button``.
+There are only a few hundred distinct palettes, so rendered PNGs are cached by
+their hex colours.
+"""
+import io
+from functools import lru_cache
+
+from PIL import Image, ImageDraw, ImageFont
+
+SWATCH_SIZE = 180
+GAP = 16
+MARGIN = 20
+LABEL_HEIGHT = 28
+BACKGROUND = (255, 255, 255)
+TEXT_COLOR = (0, 0, 0)
+
+
+def _font():
+    try:
+        return ImageFont.load_default(size=16)
+    except TypeError:
+        # Pillow < 10.1 only has the fixed-size bitmap font.
+        return ImageFont.load_default()
+
+
+def hex_to_rgb(hex_color):
+    hex_color = hex_color.lstrip('#')
+    return tuple(int(hex_color[i:i + 2], 16) for i in (0, 2, 4))
+
+
+def render_palette(hex_colors):
+    """Draw the swatch strip with hex labels as a PIL image."""
+    n = len(hex_colors)
+    width = 2 * MARGIN + n * SWATCH_SIZE + (n - 1) * GAP
+    height = 2 * MARGIN + LABEL_HEIGHT + SWATCH_SIZE
+    img = Image.new("RGB", (width, height), BACKGROUND)
+    draw = ImageDraw.Draw(img)
+    font = _font()
+    for i, hex_color in enumerate(hex_colors):
+        x = MARGIN + i * (SWATCH_SIZE + GAP)
+        y = MARGIN + LABEL_HEIGHT
+        draw.rectangle([x, y, x + SWATCH_SIZE - 1, y + SWATCH_SIZE - 1], fill=hex_to_rgb(hex_color))
+        text_width = draw.textlength(hex_color, font=font)
+        draw.text((x + (SWATCH_SIZE - text_width) / 2, MARGIN), hex_color, fill=TEXT_COLOR, font=font)
+    return img
+
+
+@lru_cache(maxsize=512)
+def _palette_png(hex_colors):
+    buf = io.BytesIO()
+    render_palette(hex_colors).save(buf, format="PNG", optimize=True)
+    return buf.getvalue()
+
+
+def palette_png(hex_colors):
+    """PNG bytes for a palette, rendered at most once per distinct palette."""
+    return _palette_png(tuple(hex_colors))
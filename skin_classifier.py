@@ -0,0 +1,102 @@
+"""Vectorized skin tone and undertone classification.
+
+Colours are BGR, like every image and colour centre in the pipeline. Both
+rules depend on very little of the colour, so the lookup tables are tiny and
+exact instead of a quantized RGB cube:
+
+* tone depends only on brightness, i.e. on ``b + g + r`` (0..765), so
+  ``TONE_BY_SUM`` maps each channel sum to a tone code;
+* undertone depends only on how the channels compare, so the comparison bits
+  index ``UNDERTONE_BY_ORDER``.
+
+Codes index ``palette_index.SKIN_TONES`` and ``UNDERTONES`` and can be passed
+straight to ``PaletteIndex.predict_batch``. Classifying an (N, 3) array is two
+gathers, so per-pixel distributions of a whole face cost about as much as one
+pass over its pixels.
+"""
+import numpy as np
+
+from palette_index import SKIN_TONES, UNDERTONES
+
+# Minimum mean channel value for each tone, lightest first; below the last
+# threshold is the last tone.
+TONE_THRESHOLDS = (210, 170, 130, 100, 70)
+
+COOL, WARM, NEUTRAL = (UNDERTONES.index(u) for u in ("Cool", "Warm", "Neutral"))
+
+
+def _tone_table():
+    sums = np.arange(3 * 255 + 1)
+    # brightness >= t  <=>  channel sum >= 3 * t, exactly, for integer colours;
+    # the code is the number of thresholds the colour falls short of.
+    return (sums[:, None] < 3 * np.array(TONE_THRESHOLDS)).sum(axis=1).astype(np.uint8)
+
+
+def _undertone_table():
+    table = np.full(16, NEUTRAL, dtype=np.uint8)
+    for bits in range(16):
+        r_gt_g, b_gt_g, g_gt_b, r_gt_b = (bool(bits >> i & 1) for i in range(4))
+        if r_gt_g and b_gt_g:
+            table[bits] = COOL
+        elif g_gt_b and r_gt_b:
+            table[bits] = WARM
+    return table
+
+
+TONE_BY_SUM = _tone_table()
+UNDERTONE_BY_ORDER = _undertone_table()
+
+
+def _channels(colors_bgr):
+    colors = np.asarray(colors_bgr)
+    if colors.dtype != np.uint8:
+        # Images are already uint8; colour centres may be ints or floats.
+        colors = np.clip(np.rint(colors), 0, 255).astype(np.uint8)
+    return colors[..., 0], colors[..., 1], colors[..., 2]
+
+
+def tone_codes(colors_bgr):
+    b, g, r = _channels(colors_bgr)
+    total = b.astype(np.uint16)
+    total += g
+    total += r
+    return TONE_BY_SUM[total]
+
+
+def undertone_codes(colors_bgr):
+    b, g, r = _channels(colors_bgr)
+    bits = (r > g).view(np.uint8)
+    bits |= (b > g).view(np.uint8) << 1
+    bits |= (g > b).view(np.uint8) << 2
+    bits |= (r > b).view(np.uint8) << 3
+    return UNDERTONE_BY_ORDER[bits]
+
+
+def classify(colors_bgr):
+    """``(tone_codes, undertone_codes)`` for an array of BGR colours of shape (..., 3)."""
+    return tone_codes(colors_bgr), undertone_codes(colors_bgr)
+
+
+def distribution(colors_bgr, weights=None):
+    """Share of each tone and undertone among ``colors_bgr``.
+
+    Returns ``(tones, undertones)``: float arrays of length ``len(SKIN_TONES)``
+    and ``len(UNDERTONES)`` summing to 1 (all zeros for no colours). ``weights``
+    can carry per-colour pixel counts, e.g. histogram bin counts.
+    """
+    colors = np.asarray(colors_bgr).reshape(-1, 3)
+    tones, undertones = classify(colors)
+    tone_counts = np.bincount(tones, weights=weights, minlength=len(SKIN_TONES))
+    undertone_counts = np.bincount(undertones, weights=weights, minlength=len(UNDERTONES))
+    total = tone_counts.sum()
+    if total <= 0:
+        return tone_counts.astype(float), undertone_counts.astype(float)
+    return tone_counts / total, undertone_counts / total
+
+
+def classify_skin(bgr):
+    return SKIN_TONES[int(tone_codes(bgr))]
+
+
+def estimate_undertone(bgr):
+    return UNDERTONES[int(undertone_codes(bgr))]